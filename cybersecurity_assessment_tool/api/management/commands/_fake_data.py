@@ -0,0 +1,61 @@
+"""
+Faker helpers for populate_data.
+
+Kept free of Django imports: with --workers, _fake_report_payloads runs in a
+ProcessPoolExecutor, and under the spawn start method (the default on macOS
+and Windows) each worker re-imports the module the function lives in. Importing
+api.models there fails with AppRegistryNotReady, since the worker never runs
+django.setup().
+"""
+
+import random
+from functools import lru_cache
+
+from faker import Faker
+
+# Explicit locale: Faker() also resolves the locale from the environment
+fake = Faker('en_US')
+
+# Values generated per Faker pool
+POOL_SIZE = 500
+
+@lru_cache(maxsize=None)
+def _pool(provider, **kwargs):
+    """
+    Pregenerated values for a Faker provider. Faker dominates seeding time once
+    the inserts are batched, so the per-row fields draw from these instead.
+    """
+    method = getattr(fake, provider)
+    return tuple(method(**kwargs) for _ in range(POOL_SIZE))
+
+def _fake(provider, **kwargs):
+    return random.choice(_pool(provider, **kwargs))
+
+def _chance(percent):
+    """Same as fake.boolean(chance_of_getting_true=percent), without the Faker dispatch."""
+    return random.random() * 100 < percent
+
+def _fake_report_payloads(seed, count, now):
+    """
+    Generates the field values for `count` reports. With --workers this runs in
+    child processes, so it reseeds first: forked workers inherit the parent's
+    random and Faker state and would otherwise all generate the same reports.
+    """
+    if seed is not None:
+        random.seed(seed)
+        fake.seed_instance(seed)
+    payloads = []
+    for _ in range(count):
+        # Matching the new report_text EncryptedJSONField
+        report_data = {
+            "executive_summary": _fake('paragraph'),
+            "scope": _fake('sentence'),
+            "methodology": "Automated Scan and Manual Review",
+            "findings_count": random.randint(1, 20)
+        }
+        payloads.append({
+            "report_name": _fake('catch_phrase') + " Cybersecurity Report",
+            "completed": now if _chance(50) else None,
+            "report_text": report_data,  # Now a dict for JSONField
+        })
+    return payloads
@@ -1,39 +1,71 @@
-from django.core.management.base import BaseCommand
-from api.models import Vulnerability  # Adjust 'api' to your actual app name
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.models import Report, Risk
+
+# Dummy vulnerability data (AI SLOP)
+DUMMY_VULNERABILITIES = (
+    # Critical severity
+    {'risk_name': 'Remote Code Execution in Apache', 'severity': 'Critical', 'overview': 'Apache HTTP Server 2.4.48 and earlier allows remote code execution'},
+    {'risk_name': 'SQL Injection Vulnerability', 'severity': 'Critical', 'overview': 'Blind SQL injection in login parameter'},
+    {'risk_name': 'Default Admin Credentials', 'severity': 'Critical', 'overview': 'Default username/password combination still enabled'},
+
+    # High severity
+    {'risk_name': 'Outdated SSL/TLS Configuration', 'severity': 'High', 'overview': 'Server supports weak SSL/TLS protocols'},
+    {'risk_name': 'Cross-Site Scripting (XSS)', 'severity': 'High', 'overview': 'Reflected XSS in search parameter'},
+    {'risk_name': 'Weak Password Policy', 'severity': 'High', 'overview': 'Password policy allows weak passwords'},
+
+    # Medium severity
+    {'risk_name': 'Missing HTTP Security Headers', 'severity': 'Medium', 'overview': 'X-Frame-Options, CSP headers missing'},
+    {'risk_name': 'Directory Listing Enabled', 'severity': 'Medium', 'overview': 'Web server exposes directory contents'},
+    {'risk_name': 'Session Fixation', 'severity': 'Medium', 'overview': 'Session ID not regenerated after login'},
+
+    # Low severity
+    {'risk_name': 'Server Banner Disclosure', 'severity': 'Low', 'overview': 'Server reveals version information'},
+    {'risk_name': 'Cookie Without Secure Flag', 'severity': 'Low', 'overview': 'Cookies transmitted over unencrypted connection'},
+    {'risk_name': 'Unnecessary Service Running', 'severity': 'Low', 'overview': 'Unused network service is enabled'},
+)
 
 class Command(BaseCommand):
     help = 'Adds dummy vulnerability data to the database'
 
-    def handle(self, *args, **kwargs):
-        # Clear existing data (optional)
-        Vulnerability.objects.all().delete()
-        
-        # Dummy vulnerability data (AI SLOP)
-        dummy_vulnerabilities = [
-            # Critical severity
-            {'risk_name': 'Remote Code Execution in Apache', 'severity': 'Critical', 'overview': 'Apache HTTP Server 2.4.48 and earlier allows remote code execution'},
-            {'risk_name': 'SQL Injection Vulnerability', 'severity': 'Critical', 'overview': 'Blind SQL injection in login parameter'},
-            {'risk_name': 'Default Admin Credentials', 'severity': 'Critical', 'overview': 'Default username/password combination still enabled'},
-            
-            # High severity
-            {'risk_name': 'Outdated SSL/TLS Configuration', 'severity': 'High', 'overview': 'Server supports weak SSL/TLS protocols'},
-            {'risk_name': 'Cross-Site Scripting (XSS)', 'severity': 'High', 'overview': 'Reflected XSS in search parameter'},
-            {'risk_name': 'Weak Password Policy', 'severity': 'High', 'overview': 'Password policy allows weak passwords'},
-            
-            # Medium severity
-            {'risk_name': 'Missing HTTP Security Headers', 'severity': 'Medium', 'overview': 'X-Frame-Options, CSP headers missing'},
-            {'risk_name': 'Directory Listing Enabled', 'severity': 'Medium', 'overview': 'Web server exposes directory contents'},
-            {'risk_name': 'Session Fixation', 'severity': 'Medium', 'overview': 'Session ID not regenerated after login'},
-            
-            # Low severity
-            {'risk_name': 'Server Banner Disclosure', 'severity': 'Low', 'overview': 'Server reveals version information'},
-            {'risk_name': 'Cookie Without Secure Flag', 'severity': 'Low', 'overview': 'Cookies transmitted over unencrypted connection'},
-            {'risk_name': 'Unnecessary Service Running', 'severity': 'Low', 'overview': 'Unused network service is enabled'},
-        ]
-        
-        # Create vulnerabilities
-        for vuln_data in dummy_vulnerabilities:
-            Vulnerability.objects.create(**vuln_data)
-            self.stdout.write(f'Created: {vuln_data["name"]}')
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully added {len(dummy_vulnerabilities)} vulnerabilities'))
\ No newline at end of file
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--report",
+            help="ID of the report to attach the risks to. Defaults to the most recent report.",
+        )
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            try:
+                report = Report.objects.filter(report_id=options["report"]).first()
+            except ValidationError:
+                raise CommandError(f'"{options["report"]}" is not a valid report ID.')
+        else:
+            report = Report.objects.order_by('-started').first()
+
+        if report is None:
+            raise CommandError("No report found. Run populate_data or generate a report first.")
+
+        with transaction.atomic():
+            # Clear the dummy risks from a previous run
+            Risk.objects.filter(
+                report=report,
+                risk_name__in=[vuln_data['risk_name'] for vuln_data in DUMMY_VULNERABILITIES],
+            ).delete()
+
+            Risk.objects.bulk_create([
+                Risk(
+                    report=report,
+                    organization_id=report.organization_id,
+                    recommendations={},
+                    affected_elements='N/A',
+                    **vuln_data,
+                )
+                for vuln_data in DUMMY_VULNERABILITIES
+            ])
+
+        for vuln_data in DUMMY_VULNERABILITIES:
+            self.stdout.write(f'Created: {vuln_data["risk_name"]}')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully added {len(DUMMY_VULNERABILITIES)} vulnerabilities to "{report}"'))
@@ -1,147 +1,271 @@
+import os
 import random
 import uuid
-from datetime import datetime, timedelta
-from django.core.management.base import BaseCommand
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, count, islice
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Permission
-from api.models import FontSize, Organization, User, Report, Risk, Color, Frequency
-from faker import Faker
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from api.models import FontSize, Organization, User, Report, Risk, Color, Frequency, generate_email_hash
+# Faker helpers live in a Django-free module so --workers also works under spawn
+from ._fake_data import _chance, _fake, _fake_report_payloads, fake
 
-fake = Faker()
+# Rows per INSERT for bulk_create. Lower it if large seeds run out of memory.
+BATCH_SIZE = int(os.environ.get('POPULATE_BATCH_SIZE', '100'))
 
-def create_organizations(num_orgs=5):
+# Reports generated per task when --workers is used
+WORKER_CHUNK_SIZE = 64
+
+# Choice values, looked up once (TextChoices.values builds a new list per access)
+FREQUENCY_VALUES = Frequency.values
+FONT_SIZE_VALUES = FontSize.values
+COLOR_VALUES = Color.values
+SEVERITY_VALUES = [choice[0] for choice in Risk.SEVERITY_CHOICES]
+
+def _bulk_create_stream(model, objs, batch_size=BATCH_SIZE, **kwargs):
+    """
+    bulk_create for a generator of rows, one batch_size slice at a time, so
+    rows nothing else needs (risks, M2M links) are never all held in memory.
+    Extra kwargs go to bulk_create. Returns the number of rows created.
+    """
+    objs = iter(objs)
+    total = 0
+    for batch in iter(lambda: list(islice(objs, batch_size)), []):
+        model.objects.bulk_create(batch, **kwargs)
+        total += len(batch)
+    return total
+
+def create_organizations(num_orgs=5, batch_size=BATCH_SIZE):
     """Creates fake Organization objects."""
-    orgs = []
     print(f"Creating {num_orgs} organizations...")
-    for _ in range(num_orgs):
-        org = Organization.objects.create(
-            org_name=fake.company(),
-            email_domain=fake.domain_name(),
-            website_domain=fake.domain_name(),
-            external_ip=fake.ipv4(),
-            require_mfa_email=fake.boolean(),
-            require_mfa_sensitive_data=fake.boolean(),
-            require_mfa_computer=fake.boolean(),
-            employee_acceptable_use_policy=fake.boolean(),
-            training_new_employees=fake.boolean(),
-            training_once_per_year=fake.boolean(),
+
+    # Generate each field in one pass, then zip them into the rows
+    names = [fake.company() for _ in range(num_orgs)]
+    email_domains = [fake.domain_name() for _ in range(num_orgs)]
+    website_domains = [fake.domain_name() for _ in range(num_orgs)]
+    ips = [fake.ipv4() for _ in range(num_orgs)]
+
+    orgs = [
+        Organization(
+            org_name=name,
+            email_domain=email_domain,
+            website_domain=website_domain,
+            external_ip=ip,
+            require_mfa_email=_chance(50),
+            require_mfa_sensitive_data=_chance(50),
+            require_mfa_computer=_chance(50),
+            employee_acceptable_use_policy=_chance(50),
+            training_new_employees=_chance(50),
+            training_once_per_year=_chance(50),
         )
-        orgs.append(org)
+        for name, email_domain, website_domain, ip in zip(names, email_domains, website_domains, ips)
+    ]
+    Organization.objects.bulk_create(orgs, batch_size=batch_size)
     print("Organizations created successfully.")
     return orgs
 
-def create_users(organizations, num_users_per_org=5):
+def create_users(organizations, num_users_per_org=5, batch_size=BATCH_SIZE):
     """Creates fake User objects linked to organizations."""
     users = []
-    all_permissions = list(Permission.objects.all())
-    print(f"Creating {num_users_per_org * len(organizations)} users...")
+    all_permissions = list(Permission.objects.values_list('id', flat=True))
+    # Hashing is deliberately slow, and every fake user gets the same password
+    password = make_password('password123')
+    total = num_users_per_org * len(organizations)
+    print(f"Creating {total} users...")
+
+    # Draw every user's settings up front
+    frequencies = iter(random.choices(FREQUENCY_VALUES, k=total))
+    font_sizes = iter(random.choices(FONT_SIZE_VALUES, k=total))
+    colors = iter(random.choices(COLOR_VALUES, k=total))
+
+    # Suffix that keeps fake usernames and emails unique. Starting after the
+    # existing users lets a re-run without --reset add users next to the last
+    # run's instead of colliding with them.
+    suffixes = count(User.objects.count() + 1)
 
     for org in organizations:
-        for i in range(num_users_per_org):
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            # UUID hex used for uniqueness
-            username = f"{first_name.lower()}_{last_name.lower()}_{i}_{org.organization_id.hex[:4]}"
+        for _ in range(num_users_per_org):
+            first_name = _fake('first_name')
+            last_name = _fake('last_name')
+            # A duplicate username or email would fail the whole bulk_create batch
+            n = next(suffixes)
+            username = f"{first_name.lower()}_{last_name.lower()}_{n}"
 
-            user = User.objects.create(
+            email = f"{first_name.lower()}.{last_name.lower()}{n}@{org.email_domain}"
+            user = User(
                 organization=org,
                 username=username[:150],
                 first_name=first_name,
                 last_name=last_name,
-                email=f"{first_name.lower()}.{last_name.lower()}@{org.email_domain}",
-                is_staff=fake.boolean(chance_of_getting_true=10),
+                email=email,
+                # bulk_create skips User.save(), which normally sets this
+                email_hash=generate_email_hash(email),
+                password=password,
+                is_staff=_chance(10),
                 is_superuser=False,
-                auto_frequency=random.choice(Frequency.values),
-                font_size=random.choice(FontSize.values),
-                color=random.choice(Color.values),
+                auto_frequency=next(frequencies),
+                font_size=next(font_sizes),
+                color=next(colors),
             )
-            user.set_password('password123')
-            user.save()
+            users.append(user)
 
-            # Assign random permissions
-            num_permissions = random.randint(0, 5)
-            selected_permissions = random.sample(all_permissions, num_permissions)
-            user.user_permissions.set(selected_permissions)
+    # No upsert: a colliding username may be a real account, and overwriting
+    # its email, organization or is_staff would be far worse than failing
+    try:
+        User.objects.bulk_create(users, batch_size=batch_size)
+    except IntegrityError as e:
+        raise CommandError(f"A generated user already exists ({e}). Run with --reset to start over.") from e
+
+    # Assign random permissions
+    UserPermission = User.user_permissions.through
+    user_permissions = (
+        UserPermission(user_id=user.pk, permission_id=permission_id)
+        for user in users
+        for permission_id in random.sample(all_permissions, random.randint(0, min(5, len(all_permissions))))
+    )
+    _bulk_create_stream(UserPermission, user_permissions, batch_size, ignore_conflicts=True)
 
-            users.append(user)
     print("Users created successfully.")
     return users
 
-def create_reports(organizations, users, num_reports_per_org=3):
+def create_reports(organizations, users, num_reports_per_org=3, batch_size=BATCH_SIZE, workers=1):
     """Creates fake Report objects matching EncryptedJSONField."""
-    reports = []
     print(f"Creating {num_reports_per_org * len(organizations)} reports...")
 
+    users_by_org = defaultdict(list)
+    for u in users:
+        users_by_org[u.organization_id].append(u)
+
+    owners = []
     for org in organizations:
-        org_users = [u for u in users if u.organization == org]
+        org_users = users_by_org[org.organization_id]
         if not org_users:
             continue
 
         for _ in range(num_reports_per_org):
-            user = random.choice(org_users)
-            
-            # Matching the new report_text EncryptedJSONField
-            report_data = {
-                "executive_summary": fake.paragraph(),
-                "scope": fake.sentence(),
-                "methodology": "Automated Scan and Manual Review",
-                "findings_count": random.randint(1, 20)
-            }
+            owners.append((org, random.choice(org_users)))
 
-            report = Report.objects.create(
-                user_created=user,
-                organization=org,
-                report_name=fake.catch_phrase() + " Cybersecurity Report",
-                completed=datetime.now() if fake.boolean() else None,
-                report_text=report_data,  # Now a dict for JSONField
-            )
-            reports.append(report)
-    print("Reports created successfully.")
-    return reports
+    # One timestamp for the whole run; also avoids naive datetimes with USE_TZ
+    now = timezone.now()
 
-def create_risks(reports, num_risks_per_report=4):
-    """Creates fake Risk objects matching new severity choices and field names."""
-    print(f"Creating risks for {len(reports)} reports...")
+    if workers > 1:
+        # Faker is pure CPU, so spread it over processes; the inserts stay here
+        counts = [
+            min(WORKER_CHUNK_SIZE, len(owners) - start)
+            for start in range(0, len(owners), WORKER_CHUNK_SIZE)
+        ]
+        seeds = [random.getrandbits(64) for _ in counts]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            payloads = list(chain.from_iterable(executor.map(_fake_report_payloads, seeds, counts, [now] * len(counts))))
+    else:
+        payloads = _fake_report_payloads(None, len(owners), now)
 
-    severity_list = [choice[0] for choice in Risk.SEVERITY_CHOICES]
+    reports = [
+        Report(user_created=user, organization=org, **payload)
+        for (org, user), payload in zip(owners, payloads)
+    ]
+    Report.objects.bulk_create(reports, batch_size=batch_size)
+    print("Reports created successfully.")
+    return reports
 
+def _fake_risks(reports, num_risks_per_report):
     for report in reports:
-        for _ in range(random.randint(1, num_risks_per_report)):
+        count = random.randint(1, num_risks_per_report)
+        for severity in random.choices(SEVERITY_VALUES, k=count):
             # Matching the new recommendations EncryptedJSONField
             recs = {
-                "immediate_action": fake.sentence(),
-                "long_term_strategy": fake.sentence(),
-                "references": [fake.url() for _ in range(2)]
+                "immediate_action": _fake('sentence'),
+                "long_term_strategy": _fake('sentence'),
+                "references": [_fake('url') for _ in range(2)]
             }
 
-            Risk.objects.create(
-                risk_name=fake.word().capitalize() + " Risk",
+            yield Risk(
+                risk_name=_fake('word').capitalize() + " Risk",
                 report=report,
                 organization=report.organization,
-                overview=fake.paragraph(nb_sentences=5),
+                overview=_fake('paragraph', nb_sentences=5),
                 recommendations=recs,  # Now a dict for JSONField
-                severity=random.choice(severity_list), # Choice string instead of int
-                affected_elements=fake.text(max_nb_chars=100), # Renamed from 'affected'
-                is_archived=fake.boolean(chance_of_getting_true=10),
+                severity=severity, # Choice string instead of int
+                affected_elements=_fake('text', max_nb_chars=100), # Renamed from 'affected'
+                is_archived=_chance(10),
             )
-    print("Risks created successfully.")
+
+def create_risks(reports, num_risks_per_report=4, batch_size=BATCH_SIZE):
+    """Creates fake Risk objects matching new severity choices and field names."""
+    print(f"Creating risks for {len(reports)} reports...")
+
+    created = _bulk_create_stream(Risk, _fake_risks(reports, num_risks_per_report), batch_size)
+    print(f"{created} risks created successfully.")
 
 class Command(BaseCommand):
-    help = 'Populates the database with fake data for development.'
+    help = (
+        'Populates the database with fake data for development. '
+        'Rows are inserted in batches of POPULATE_BATCH_SIZE (env, default 100).'
+    )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes used to generate fake reports. Defaults to 1 (no pool).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Seed for random and Faker, to generate the same data on every run.",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help=(
+                "Delete existing organizations, users, reports and risks first. Without it, "
+                "every run adds a new set of organizations, users, reports and risks."
+            ),
+        )
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help=(
+                "Like --reset, but with one TRUNCATE ... CASCADE instead of ORM deletes. "
+                "PostgreSQL only; skips delete signals and also empties every table that "
+                "references organizations, users, reports or risks."
+            ),
+        )
+
+    @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Starting fake data population...'))
 
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            fake.seed_instance(options['seed'])
+
         # 1. Clear existing data
-        self.stdout.write(self.style.NOTICE('Clearing existing data...'))
-        Risk.objects.all().delete()
-        Report.objects.all().delete()
-        User.objects.all().delete()
-        Organization.objects.all().delete()
+        if options['truncate']:
+            self.stdout.write(self.style.NOTICE('Clearing existing data...'))
+            if connection.vendor != 'postgresql':
+                raise CommandError("--truncate is only supported on PostgreSQL.")
+            tables = ", ".join(
+                connection.ops.quote_name(model._meta.db_table)
+                for model in (Risk, Report, User, Organization)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        elif options['reset']:
+            self.stdout.write(self.style.NOTICE('Clearing existing data...'))
+            Risk.objects.all().delete()
+            Report.objects.all().delete()
+            User.objects.all().delete()
+            Organization.objects.all().delete()
 
         # 2. Re-populate
         organizations = create_organizations(num_orgs=5)
         users = create_users(organizations, num_users_per_org=5)
-        reports = create_reports(organizations, users, num_reports_per_org=3)
+        reports = create_reports(organizations, users, num_reports_per_org=3, workers=options['workers'])
         create_risks(reports, num_risks_per_report=4)
 
         # Superuser creation
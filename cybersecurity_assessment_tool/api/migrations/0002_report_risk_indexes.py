@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-15 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['organization', '-started'], name='api_report_organiz_60fc78_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='risk',
+            index=models.Index(fields=['organization', 'is_archived'], name='api_risk_organiz_8ec4f0_idx'),
+        ),
+    ]
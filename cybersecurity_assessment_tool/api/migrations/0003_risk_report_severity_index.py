@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-15 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_report_risk_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='risk',
+            index=models.Index(fields=['report', 'severity'], name='api_risk_report__3941f2_idx'),
+        ),
+    ]
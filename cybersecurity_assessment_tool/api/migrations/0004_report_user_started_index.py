@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-15 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_risk_report_severity_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user_created', '-started'], name='api_report_user_cr_504229_idx'),
+        ),
+    ]
@@ -168,6 +168,15 @@ class User(AbstractUser):
         """Return username"""
         return self.username
 
+class ReportQuerySet(models.QuerySet):
+    def summaries(self):
+        """
+        Reports without report_text, for list pages. The text is the full
+        encrypted AI report, so loading it means decrypting and parsing a
+        multi-KB blob per row that the list never shows.
+        """
+        return self.defer('report_text')
+
 class Report(models.Model):
     report_id = models.UUIDField(
         primary_key = True,
@@ -182,7 +191,15 @@ class Report(models.Model):
     report_text = EncryptedJSONField(default=dict)
     #is_checked = models.BooleanField(default=False)
 
+    objects = ReportQuerySet.as_manager()
+
     class Meta:
+        indexes = [
+            # Organization report lists, newest first
+            models.Index(fields=['organization', '-started']),
+            # A user's own reports, newest first (list_reports_by_user)
+            models.Index(fields=['user_created', '-started']),
+        ]
         permissions = [
             #("can_check_report", "Can check a report before publishing."),
             ("can_view_any_report", "Can review any report, regardless of organization."),
@@ -226,6 +243,12 @@ class Risk(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
+        indexes = [
+            # Active risks for an organization (dashboard, risk list, AI context)
+            models.Index(fields=['organization', 'is_archived']),
+            # Per-report severity counts on the reports page
+            models.Index(fields=['report', 'severity']),
+        ]
         permissions = [
             ("can_view_risk", "Can view the risk."),
             ("can_view_all_risk", "Can view any risk, regardless of organization."),
@@ -337,7 +360,7 @@ class OTPVerification(models.Model):
         return not self.is_verified and self.expires_at > timezone.now()
 
 
-import json
+import orjson
 from django.conf import settings
 from cryptography.fernet import Fernet, InvalidToken
 
@@ -608,13 +631,13 @@ class Scan(models.Model):
         if not self.raw_findings_json:
             return []
         try:
-            return json.loads(self.raw_findings_json)
-        except json.JSONDecodeError:
+            return orjson.loads(self.raw_findings_json)
+        except orjson.JSONDecodeError:
             return []
 
     def set_findings(self, findings: list):
         """Serialize and store findings list to encrypted JSON field."""
-        self.raw_findings_json = json.dumps(findings)
+        self.raw_findings_json = orjson.dumps(findings).decode()
 
     def tally_findings(self, findings: list):
         """Populate severity count fields from a findings list."""
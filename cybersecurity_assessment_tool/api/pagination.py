@@ -0,0 +1,10 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class DefaultLimitOffsetPagination(LimitOffsetPagination):
+    """
+    ?limit=&offset= paging with a default page, so a plain list request never
+    serializes a whole table. max_limit caps what a client can ask for.
+    """
+    default_limit = 50
+    max_limit = 500
@@ -8,7 +8,14 @@ class OrganizationSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Organization
-        fields = '__all__'
+        # listed explicitly (same set as '__all__') so new model fields aren't exposed by accident
+        fields = [
+            'organization_id', 'org_name', 'email_domain', 'website_domain', 'external_ip',
+            'require_mfa_email', 'require_mfa_computer', 'require_mfa_sensitive_data',
+            'employee_acceptable_use_policy', 'training_new_employees', 'training_once_per_year',
+            'admin_rotate', 'registration_status', 'questionnaire_completed',
+            'created_at', 'approved_at'
+        ]
         read_only_fields = ('organization_id',)
         
 class UserSerializer(serializers.ModelSerializer):
@@ -35,6 +42,11 @@ class UserSerializer(serializers.ModelSerializer):
         # exclude password from the API response
         extra_kwargs = {'password': {'write_only': True}}
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Loads the relations this serializer reads, so listing users doesn't query per row."""
+        return queryset.select_related('organization').prefetch_related('groups', 'user_permissions')
+
     def create(self, validated_data):
         """Handle password hashing during user creation."""
         # use create_user to correctly hash the password
@@ -52,9 +64,34 @@ class ReportSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Report
-        fields = '__all__'
+        fields = [
+            'report_id', 'user_created_name', 'organization_name',
+            'report_name', 'started', 'completed', 'report_text',
+            'user_created', 'organization'
+        ]
         read_only_fields = ('report_id', 'user_created_name', 'organization_name')
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Joins the user and organization behind user_created_name/organization_name."""
+        return queryset.select_related('user_created', 'organization')
+
+class ReportListSerializer(ReportSerializer):
+    """
+    Serializer for listing reports.
+    Same as ReportSerializer without report_text, which the list never shows.
+    """
+    class Meta(ReportSerializer.Meta):
+        fields = [
+            'report_id', 'user_created_name', 'organization_name',
+            'report_name', 'started', 'completed'
+        ]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Also skips loading and decrypting report_text for every row."""
+        return super().setup_eager_loading(queryset).summaries()
+
 class RiskSerializer(serializers.ModelSerializer):
     """
     Serializer for the Risk model.
@@ -65,6 +102,18 @@ class RiskSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Risk
-        fields = '__all__'
+        fields = [
+            'risk_id', 'report_name', 'risk_name', 'overview', 'recommendations',
+            'severity', 'affected_elements', 'is_archived', 'resolved_at',
+            'report', 'organization', 'resolved_by'
+        ]
         # the 'severity' field uses validators defined in the model.
-        read_only_fields = ('risk_id',) # Added risk_id as read_only
\ No newline at end of file
+        read_only_fields = ('risk_id',) # Added risk_id as read_only
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Joins the report behind report_name. The report body is deferred: it is
+        large, encrypted and not part of the risk output.
+        """
+        return queryset.select_related('report').defer('report__report_text')
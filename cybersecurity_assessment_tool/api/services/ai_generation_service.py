@@ -1,11 +1,36 @@
-import json
+import asyncio
+import hashlib
+import logging
 import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+import google.ai.generativelanguage as glm
 import google.generativeai as gen
 import jsonschema
+import orjson
+from google.generativeai.types import generation_types
 from typing import Dict, Any
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
-from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, DeadlineExceeded
-import time
+from django.core.cache import cache
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    InternalServerError,
+    InvalidArgument,
+    NotFound,
+    PermissionDenied,
+    ResourceExhausted,
+    ServiceUnavailable,
+    Unauthenticated,
+)
+from google.rpc import error_details_pb2
+
+from . import llm_cache
+
+logger = logging.getLogger(__name__)
 
 # -----------------------------------------------------------------------------
 # MODEL SETUP
@@ -15,7 +40,141 @@ gen.configure(api_key=settings.API_KEY)
 
 # Change the model here
 MODEL_NAME = 'gemini-2.5-pro'
-model = gen.GenerativeModel(model_name=MODEL_NAME)
+
+# Keys that hit a rate limit, mapped to the time.monotonic() they can be used again
+_key_cooldowns = {}
+
+# Seconds a rate-limited key is skipped; Gemini's limits are per minute
+KEY_COOLDOWN = 60
+
+# Max Gemini pipelines in flight at once for ai_generation_batch
+BATCH_CONCURRENCY = settings.GEMINI_BATCH_CONCURRENCY
+
+class _LoopModels:
+    """The Gemini client and models used by the pipelines of one event loop."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        self.report = self.bind(gen.GenerativeModel(model_name=MODEL_NAME, system_instruction=REPORT_PROMPT))
+        self.risk = self.bind(gen.GenerativeModel(model_name=MODEL_NAME, system_instruction=RISK_PROMPT))
+        # Context-cached models by CachedContent name (see _context_cached_model)
+        self.cached = {}
+
+    def bind(self, model):
+        # GenerativeModel takes no client argument; generate_content_async uses
+        # this attribute when set (google-generativeai is pinned for it)
+        model._async_client = self.client
+        return model
+
+# Running event loop -> _LoopModels, see _loop_models
+_models_by_loop = {}
+_models_lock = threading.Lock()
+
+def _loop_models() -> _LoopModels:
+    """
+    The client and models for the running event loop, created on first use.
+    grpc.aio channels are tied to the loop that created them, and every call to
+    ai_generation_service runs on its own loop, so the SDK's cached default
+    client cannot be reused between runs. Each loop gets its own models rather
+    than swapping the client on shared ones, so pipelines on different loops
+    (threaded workers, a sync call during a batch) never touch each other's.
+    Pipelines sharing a loop (batches) share one client.
+    """
+    loop = asyncio.get_running_loop()
+    with _models_lock:
+        models = _models_by_loop.get(loop)
+        if models is None:
+            # Entries for finished loops hold a dead channel; drop them here
+            for stale in [other for other in _models_by_loop if other.is_closed()]:
+                del _models_by_loop[stale]
+            models = _models_by_loop[loop] = _LoopModels(_next_key())
+    return models
+
+def _next_key() -> str:
+    """The key whose rate limit cooldown ends first; never-limited keys come first, in order."""
+    return min(settings.GEMINI_API_KEYS, key=lambda key: _key_cooldowns.get(key, 0))
+
+def _rotate_key() -> bool:
+    """
+    Puts the running loop's key on cooldown after a rate limit and moves its
+    models to the next key. Returns False when every key is cooling down, in
+    which case the caller should back off instead of retrying right away.
+    """
+    loop = asyncio.get_running_loop()
+    _key_cooldowns[_loop_models().api_key] = time.monotonic() + KEY_COOLDOWN
+    key = _next_key()
+    if _key_cooldowns.get(key, 0) > time.monotonic():
+        return False
+    with _models_lock:
+        _models_by_loop[loop] = _LoopModels(key)
+    return True
+
+# Gemini CachedContents by _context_cache_key: (cached_content, expires_at)
+_context_cached_models = {}
+
+# Seconds before Gemini drops a CachedContent that we stop using it
+CONTEXT_CACHE_MARGIN = 60
+
+def _context_cache_key(system_instruction: str, prefix: str) -> str:
+    """Django cache key holding the CachedContent name for an instruction + prefix."""
+    digest = hashlib.sha256(f"{MODEL_NAME}\x00{system_instruction}\x00{prefix}".encode('utf-8')).hexdigest()
+    return f"gemini_context_cache:{digest}"
+
+def _seconds_left(cached_content) -> float:
+    """Seconds until Gemini drops `cached_content`, less CONTEXT_CACHE_MARGIN."""
+    remaining = (cached_content.expire_time - datetime.now(dt_timezone.utc)).total_seconds()
+    return remaining - CONTEXT_CACHE_MARGIN
+
+async def _context_cached_model(system_instruction: str, prefix: str):
+    """
+    Returns a model whose system instruction and `prefix` live in a Gemini
+    CachedContent, so only the per-org part of the prompt is sent and billed at
+    the full input rate. Returns None when context caching is disabled or the
+    cache can't be created; callers then send the full prompt.
+
+    The cache is keyed on a hash of the model, instruction and prefix, so any
+    prompt or example edit gets a new cache instead of reusing a stale one. The
+    cache name is shared through Django's cache so worker processes reuse it.
+    """
+    # Cached contents belong to the key's project, so they can't follow key rotation
+    if not settings.GEMINI_CONTEXT_CACHE_ENABLED or len(settings.GEMINI_API_KEYS) > 1:
+        return None
+
+    name_key = _context_cache_key(system_instruction, prefix)
+    cached = _context_cached_models.get(name_key)
+    if cached is None or cached[1] <= time.monotonic():
+        try:
+            name = await cache.aget(name_key)
+            cached_content = await asyncio.to_thread(gen.caching.CachedContent.get, name=name) if name else None
+            # Another worker's cache may be nearly gone; its expiry, not ours, counts
+            if cached_content is None or _seconds_left(cached_content) <= 0:
+                cached_content = await asyncio.to_thread(
+                    gen.caching.CachedContent.create,
+                    model=MODEL_NAME,
+                    system_instruction=system_instruction,
+                    contents=[prefix],
+                    ttl=timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL),
+                )
+            seconds_left = _seconds_left(cached_content)
+            # Expire our pointer a bit before Gemini drops the cache
+            await cache.aset(name_key, cached_content.name, timeout=max(int(seconds_left), 1))
+        except Exception as e:
+            logger.warning("Gemini context cache unavailable, sending the full prompt: %s", e)
+            return None
+
+        cached = (cached_content, time.monotonic() + seconds_left)
+        _context_cached_models[name_key] = cached
+
+    # The CachedContent is shared by the process, the model is per loop like
+    # the plain ones (see _loop_models)
+    cached_content = cached[0]
+    models = _loop_models()
+    cached_model = models.cached.get(cached_content.name)
+    if cached_model is None:
+        cached_model = models.bind(gen.GenerativeModel.from_cached_content(cached_content))
+        models.cached[cached_content.name] = cached_model
+    return cached_model
 
 # -----------------------------------------------------------------------------
 # REPORT SCHEMA
@@ -149,11 +308,39 @@ RISK_SCHEMA_JSON: Dict[str, Any] = {
     "required": ["thought", "new vulnerabilities", "all vulnerabilities"]
 }
 
-def _create_report_prompt() -> str:
-    """
-    Creates the report prompt to use for each report generation.
-    """
-    return """You need to always respond in a JSON format. Only output valid JSON. 
+# -----------------------------------------------------------------------------
+# GENERATION CONFIGS
+# -----------------------------------------------------------------------------
+
+# Built once at import instead of on every Gemini call. Normalizing here turns
+# the schema dicts into protos.Schema, which the SDK passes through untouched;
+# given a GenerationConfig it would convert the whole schema again per request.
+REPORT_GENERATION_CONFIG = generation_types.to_generation_config_dict(gen.types.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=REPORT_SCHEMA_JSON
+))
+
+RISK_GENERATION_CONFIG = generation_types.to_generation_config_dict(gen.types.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=RISK_SCHEMA_JSON
+))
+
+# Validators built once: jsonschema.validate() re-checks the schema and builds
+# a new validator on every call
+REPORT_VALIDATOR = jsonschema.Draft202012Validator(REPORT_SCHEMA_JSON)
+RISK_VALIDATOR = jsonschema.Draft202012Validator(RISK_SCHEMA_JSON)
+
+# Part of the LLM cache keys, so editing a schema invalidates the responses
+# cached for the old one instead of serving JSON that no longer matches it
+REPORT_SCHEMA_KEY = orjson.dumps(REPORT_SCHEMA_JSON, option=orjson.OPT_SORT_KEYS).decode()
+RISK_SCHEMA_KEY = orjson.dumps(RISK_SCHEMA_JSON, option=orjson.OPT_SORT_KEYS).decode()
+
+# -----------------------------------------------------------------------------
+# PROMPTS
+# -----------------------------------------------------------------------------
+
+# Report prompt used for each report generation
+REPORT_PROMPT = """You need to always respond in a JSON format. Only output valid JSON. 
     You are an expert cybersecurity analyst who generates comprehensive security reports. 
     You are evaluating raw technical data and a questionnaire for an organization. 
     If you do not have enough data to draw a conclusion, simply state you do not know.
@@ -169,11 +356,8 @@ def _create_report_prompt() -> str:
     Do not include conversational text or markdown. Do not include the examples in your response. 
     """
 
-def _create_risk_prompt() -> str:
-    """
-    Creates the risk prompt to use for each risk list generation.
-    """
-    return """You need to always respond in a JSON format. Only output valid JSON. 
+# Risk prompt used for each risk list generation
+RISK_PROMPT = """You need to always respond in a JSON format. Only output valid JSON. 
     You are an expert cybersecurity analyst who extracts vulnerabilities. 
     You are evaluating a security report for an organization. 
     If you do not have enough data to assess a risk, simply state you do not know. 
@@ -189,96 +373,217 @@ def _create_risk_prompt() -> str:
     Do not include any conversational text, markdown, or network scan issues. Do not include the example in your response.
     """
 
+# -----------------------------------------------------------------------------
+# MODELS
+# -----------------------------------------------------------------------------
+
+# Built per event loop by _LoopModels: one model per prompt, so the prompt
+# goes in as the system instruction instead of being prepended to every
+# request's contents
+
+ASSETS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets"))
+
+def _example_text(example) -> str:
+    """
+    Returns an example as prompt text. Files are passed through as-is: the
+    templates are already indented JSON, so loading and re-dumping them only
+    costs time and memory.
+    """
+    if isinstance(example, str):
+        with open(example, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    return orjson.dumps(example, option=orjson.OPT_INDENT_2).decode()
+
 def _create_example(example_input, example_output) -> str:
     try:
-        if isinstance(example_input, str):
-            with open(example_input, 'r') as f:
-                data_in = json.load(f)
-        else:
-            data_in = example_input
-
-        if isinstance(example_output, str):
-            with open(example_output, 'r') as f:
-                data_out = json.load(f)
-        else:
-            data_out = example_output
-            
-        return f"Example Input:\n{json.dumps(data_in, indent=2)}\n\nExample Output:\n{json.dumps(data_out, indent=2)}"
+        return "".join([
+            "Example Input:\n", _example_text(example_input),
+            "\n\nExample Output:\n", _example_text(example_output),
+        ])
     except Exception as e:
-        print(f"[WARNING] Could not load examples: {e}")
+        logger.warning("Could not load examples: %s", e)
         return "Example context missing or invalid."
 
-def _generate_report_content(questionnaire, context, chunk_callback=None):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Path setup for Example 1 (Clean / Minor Findings)
-    input_path_1 = os.path.join(current_dir, "..", "assets", "report_template", "input.json")
-    output_path_1 = os.path.join(current_dir, "..", "assets", "report_template", "output.json")
+@lru_cache(maxsize=None)
+def _report_examples() -> tuple:
+    """
+    The two report examples, read once per process: the templates only change
+    with a deploy, and every generation sends the same text.
+    """
+    template_dir = os.path.join(ASSETS_DIR, "report_template")
+    return (
+        # Example 1 (Clean / Minor Findings)
+        _create_example(os.path.join(template_dir, "input.json"), os.path.join(template_dir, "output.json")),
+        # Example 2 (Critical / Vulnerable Findings)
+        _create_example(os.path.join(template_dir, "input2.json"), os.path.join(template_dir, "output2.json")),
+    )
 
-    # Path setup for Example 2 (Critical / Vulnerable Findings)
-    input_path_2 = os.path.join(current_dir, "..", "assets", "report_template", "input2.json")
-    output_path_2 = os.path.join(current_dir, "..", "assets", "report_template", "output2.json")
+@lru_cache(maxsize=None)
+def _risk_examples() -> tuple:
+    """The risk example and its current risk list, read once per process."""
+    template_dir = os.path.join(ASSETS_DIR, "risk_template")
+    return (
+        _example_text(os.path.join(template_dir, "current_risk.json")),
+        _create_example(os.path.join(template_dir, "input.json"), os.path.join(template_dir, "output.json")),
+    )
 
-    # Create the example strings
-    example_1 = _create_example(os.path.normpath(input_path_1), os.path.normpath(output_path_1))
-    example_2 = _create_example(os.path.normpath(input_path_2), os.path.normpath(output_path_2))
+async def _evict_context_cache(system_instruction: str, prefix: str) -> None:
+    """Forgets a CachedContent Gemini no longer has, in this process and for other workers."""
+    name_key = _context_cache_key(system_instruction, prefix)
+    cached = _context_cached_models.pop(name_key, None)
+    if cached:
+        _loop_models().cached.pop(cached[0].name, None)
+    try:
+        await cache.adelete(name_key)
+    except Exception as e:
+        logger.warning("Could not clear the Gemini context cache pointer: %s", e)
 
-    print(f"--- Calling Gemini API with model: {MODEL_NAME} ---")
+async def _start_stream(model, system_instruction: str, examples: str, context_input: str, generation_config):
+    """
+    Starts a streamed generation, through the context-cached model when there
+    is one (see _context_cached_model). If Gemini has already dropped that
+    cache it answers NotFound or PermissionDenied; the cache is then evicted
+    and the full prompt sent to `model`, instead of every retry hitting the
+    same dead cache.
+    """
+    cached_model = await _context_cached_model(system_instruction, examples)
+    if cached_model:
+        try:
+            # With a context cache, the examples are already on Gemini's side
+            return await cached_model.generate_content_async(
+                contents=context_input,
+                generation_config=generation_config,
+                stream=True,
+            )
+        except (NotFound, PermissionDenied) as e:
+            logger.warning("Gemini context cache is gone, sending the full prompt: %s", e)
+            await _evict_context_cache(system_instruction, examples)
+
+    # Examples first, as in the callers' `contents` (see _generate_report_content)
+    return await model.generate_content_async(
+        contents=[examples, context_input],
+        generation_config=generation_config,
+        stream=True,
+    )
+
+async def _close_stream(response, stream):
+    """
+    Closes a streamed response that wasn't read to the end. The SDK has no
+    close(), so this closes its generator and the api_core one under it
+    (response._iterator, private; google-generativeai is pinned for it). That
+    drops the last reference to the gRPC call, which grpc.aio cancels when an
+    unfinished call is released.
+    """
+    for iterator in (stream, getattr(response, '_iterator', None)):
+        if hasattr(iterator, 'aclose'):
+            try:
+                await iterator.aclose()
+            except Exception as e:
+                logger.debug("Error closing abandoned stream: %s", e)
+
+async def _collect_stream(response, chunk_callback, label: str) -> str:
+    """
+    Reads a streamed Gemini response, forwarding each chunk to the callback,
+    and returns the full text. Gives up as soon as the output can't be the JSON
+    object we asked for, instead of paying for the rest of the generation.
+    """
+    parts = []
+    started = False
+    stream = aiter(response)
+
+    try:
+        async for chunk in stream:
+            try:
+                # Safely attempt to access the text property
+                chunk_text = chunk.text
+            except ValueError:
+                # The chunk had no valid text parts (likely finish_reason 1). 
+                # We just ignore this specific chunk and continue.
+                continue
+            if not chunk_text:
+                continue
+
+            if not started:
+                stripped = chunk_text.lstrip()
+                if stripped and stripped[0] != '{':
+                    raise RuntimeError(f"{label} output is not a JSON object: {stripped[:40]!r}")
+                started = bool(stripped)
+
+            parts.append(chunk_text)
+            logger.debug("%s: %s", label, chunk_text)
+            if chunk_callback:
+                await chunk_callback(chunk_text)
+    except BaseException:
+        # Stopped before the end (not JSON, callback error, cancelled): close
+        # the stream now, so a retry doesn't open a new one next to it
+        await _close_stream(response, stream)
+        raise
+
+    usage = getattr(response, 'usage_metadata', None)
+    if usage:
+        # cached tokens show whether the context/implicit prefix cache was hit
+        logger.info(
+            "%s tokens: prompt=%s cached=%s output=%s", label,
+            usage.prompt_token_count, usage.cached_content_token_count, usage.candidates_token_count,
+        )
+
+    return "".join(parts)
+
+def _replay(chunk_callback):
+    """
+    on_hit handler for llm_cache: sends a cached response through the stream
+    callback so the progress tracking still sees the full JSON.
+    """
+    async def on_hit(data):
+        if chunk_callback:
+            await chunk_callback(orjson.dumps(data).decode())
+    return on_hit
+
+async def _generate_report_content(questionnaire, context, chunk_callback=None, skip_cache=False, organization_id=None):
+    example_1, example_2 = _report_examples()
+
+    logger.info("Calling Gemini API with model: %s", MODEL_NAME)
     
     # Construct the full prompt with clearly marked Example blocks
-    full_prompt = (
-        f"{_create_report_prompt()}\n\n"
-        f"Context Input:\n{context}\n{questionnaire}\n\n"
+    context_input = f"Context Input:\n{context}\n{questionnaire}\n\n"
+    examples = (
         f"--- EXAMPLES START ---\n"
         f"Example 1 (Clean network, minor policy issues):\n{example_1}\n\n"
         f"Example 2 (Highly vulnerable network, severe policy issues):\n{example_2}\n"
         f"--- EXAMPLES END ---\n"
     )
+    # Static examples first, so every request shares the same prefix and
+    # Gemini's implicit prefix caching can reuse it. Sent as separate parts of
+    # one user turn, so the examples string is reused as-is on every call.
+    contents = [examples, context_input]
 
-    response = model.generate_content(
-        contents=full_prompt,
-        generation_config=gen.types.GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=REPORT_SCHEMA_JSON
-        ),
-        stream=True  # Enable streaming
-    )
+    async def _call():
+        response = await _start_stream(
+            _loop_models().report, REPORT_PROMPT, examples, context_input, REPORT_GENERATION_CONFIG,
+        )
 
-    full_text = ""
-    
-    for chunk in response:
-        try:
-            # Safely attempt to access the text property
-            chunk_text = chunk.text
-            if chunk_text:
-                full_text += chunk_text
-                print("Chunk: " + chunk_text + "\n")
-                if chunk_callback:
-                    chunk_callback(chunk_text)
-        except ValueError:
-            # The chunk had no valid text parts (likely finish_reason 1). 
-            # We just ignore this specific chunk and continue.
-            continue
-
-    if not full_text.strip():
-        raise RuntimeError("Empty response from Gemini for report generation.")
-
-    # Once the stream finishes, parse the accumulated text into JSON
-    data = json.loads(full_text)
-    jsonschema.validate(instance=data, schema=REPORT_SCHEMA_JSON)
-            
-    return data
+        full_text = await _collect_stream(response, chunk_callback, "Chunk")
+        if not full_text.strip():
+            raise RuntimeError("Empty response from Gemini for report generation.")
 
-def _add_risks(report: dict, current_risks: dict, chunk_callback=None): # <-- Add chunk_callback
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    current_risk_path = os.path.join(current_dir, "..", "assets", "risk_template", "current_risk.json")
-    output_path = os.path.join(current_dir, "..", "assets", "risk_template", "output.json")
-    input_path = os.path.join(current_dir, "..", "assets", "risk_template", "input.json")
-    
-    with open(os.path.normpath(current_risk_path), 'r', encoding='utf-8') as f:
-        example_current_risk = json.load(f)
-    
-    example = _create_example(os.path.normpath(input_path), os.path.normpath(output_path))
+        # Once the stream finishes, parse the accumulated text into JSON
+        data = orjson.loads(full_text)
+        REPORT_VALIDATOR.validate(data)
+                
+        return data
+
+    return await llm_cache.get_or_call(
+        "report",
+        (MODEL_NAME, REPORT_SCHEMA_KEY, REPORT_PROMPT, *contents),
+        _call,
+        semantic_text=f"{context}\n{questionnaire}",
+        on_hit=_replay(chunk_callback),
+        refresh=skip_cache,
+        scope=organization_id,
+    )
+
+async def _add_risks(report: dict, current_risks: dict, chunk_callback=None, skip_cache=False, organization_id=None):
+    example_current_risk, example = _risk_examples()
     
     extracted_vulnerabilities = []
     if "report" in report and isinstance(report["report"], list) and len(report["report"]) > 0:
@@ -286,99 +591,170 @@ def _add_risks(report: dict, current_risks: dict, chunk_callback=None): # <-- Ad
         extracted_vulnerabilities = readiness_section.get("Vulnerabilities Found", [])
 
     context = (
-        f"Report Vulnerabilities:\n{json.dumps(extracted_vulnerabilities, indent=2)}\n\n"
-        f"Current Risks:\n{json.dumps(current_risks, indent=2)}"
+        f"Report Vulnerabilities:\n{orjson.dumps(extracted_vulnerabilities, option=orjson.OPT_INDENT_2).decode()}\n\n"
+        f"Current Risks:\n{orjson.dumps(current_risks, option=orjson.OPT_INDENT_2).decode()}"
     )
 
-    print(f"--- Calling Gemini API with model: {MODEL_NAME} ---")
-    full_prompt = f"{_create_risk_prompt()}\n\nContext Input:\n{context}\n\nExample:\n{example}\n\nExample Current Risks:\n{example_current_risk}"
+    logger.info("Calling Gemini API with model: %s", MODEL_NAME)
+    examples = f"Example:\n{example}\n\nExample Current Risks:\n{example_current_risk}"
+    context_input = f"Context Input:\n{context}\n\n"
+    contents = [examples, context_input]
         
-    response = model.generate_content(
-        contents=full_prompt,
-        generation_config=gen.types.GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=RISK_SCHEMA_JSON
-        ),
-        stream=True  # Enable streaming
+    async def _call():
+        response = await _start_stream(
+            _loop_models().risk, RISK_PROMPT, examples, context_input, RISK_GENERATION_CONFIG,
+        )
+
+        # Stream the chunks
+        full_text = await _collect_stream(response, chunk_callback, "Risk Chunk")
+        if not full_text.strip():
+            raise RuntimeError("Empty response from Gemini for risk generation.")
+
+        # Parse and validate
+        data = orjson.loads(full_text)
+        RISK_VALIDATOR.validate(data)
+
+        return data
+
+    return await llm_cache.get_or_call(
+        "risks",
+        (MODEL_NAME, RISK_SCHEMA_KEY, RISK_PROMPT, *contents),
+        _call,
+        semantic_text=context,
+        on_hit=_replay(chunk_callback),
+        refresh=skip_cache,
+        scope=organization_id,
     )
-    
-    full_text = ""
-    
-    # Stream the chunks
-    for chunk in response:
-        try:
-            chunk_text = chunk.text
-            if chunk_text:
-                full_text += chunk_text
-                print("Risk Chunk: " + chunk_text + "\n")
-                if chunk_callback:
-                    chunk_callback(chunk_text)
-        except ValueError:
-            continue
-
-    if not full_text.strip():
-        raise RuntimeError("Empty response from Gemini for risk generation.")
-
-    # Parse and validate
-    data = json.loads(full_text)
-    jsonschema.validate(instance=data, schema=RISK_SCHEMA_JSON)
-    
-    return data
 
-def ai_generation_service(questionnaire: dict, current_risks: dict, context: str, chunk_callback=None):
+def ai_generation_service(questionnaire: dict, current_risks: dict, context: str, chunk_callback=None, skip_cache=False, organization_id=None):
     """
     Generates report and risks data using Gemini.
     Accepts an optional chunk_callback(text) to stream report progress.
+    skip_cache=True forces a new generation instead of a cached response
+    (retry_scan_generation sets it when the user retries a failed report).
+    organization_id keeps cached responses per organization (see llm_cache).
     Returns: (report_data, risks_data, error_message)
+
+    Synchronous entry point for the Django-Q tasks; the Gemini calls themselves
+    run on the async SDK (see _ai_generation_pipeline).
+    """
+    return async_to_sync(_ai_generation_pipeline)(questionnaire, current_risks, context, chunk_callback, skip_cache, organization_id)
+
+def ai_generation_batch(jobs: list, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Runs several report/risk generations concurrently on one event loop.
+    Each job is a dict of ai_generation_service keyword arguments.
+    Returns a list of (report_data, risks_data, error_message), in job order.
+    """
+    return async_to_sync(_ai_generation_batch)(jobs, concurrency)
+
+async def _ai_generation_batch(jobs: list, concurrency: int = BATCH_CONCURRENCY):
+    # Bounded so a large batch doesn't run straight into Gemini's rate limits
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await _ai_generation_pipeline(**job)
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+# Upper bound in seconds for a single retry backoff
+MAX_BACKOFF = 60
+
+def _backoff(attempt: int) -> float:
+    """
+    Exponential backoff with jitter, so concurrent pipelines that fail together
+    (rate limit, outage) don't all retry at the same moment.
+    """
+    return min(MAX_BACKOFF, 2 ** attempt + random.uniform(0, 1))
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    How long to wait before retrying after `error`. A 429 from Gemini usually
+    says when the quota frees up (google.rpc.RetryInfo); waiting less just burns
+    an attempt, so that delay is used when present.
+    """
+    for detail in getattr(error, 'details', None) or []:
+        if isinstance(detail, error_details_pb2.RetryInfo) and detail.HasField('retry_delay'):
+            delay = detail.retry_delay.ToTimedelta().total_seconds()
+            return min(MAX_BACKOFF, delay + random.uniform(0, 1))
+    return _backoff(attempt)
+
+async def _ai_generation_pipeline(questionnaire: dict, current_risks: dict, context: str, chunk_callback=None, skip_cache=False, organization_id=None):
+    """
+    Async version of ai_generation_service. Awaiting this from an event loop lets
+    several generations share one worker instead of blocking on each Gemini call.
     """
     MAX_RETRIES = 3
+
+    _loop_models()
+
+    # The callback usually writes progress to the DB cache, so it has to run
+    # outside the event loop.
+    emit = sync_to_async(chunk_callback) if chunk_callback else None
     
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            if attempt > 1 and chunk_callback:
-                chunk_callback("__RETRY_RESET__")
+            if attempt > 1 and emit:
+                await emit("__RETRY_RESET__")
                 
-            report_data = _generate_report_content(questionnaire, context, chunk_callback)
+            report_data = await _generate_report_content(questionnaire, context, emit, skip_cache, organization_id)
             
             # Send a signal to the frontend callback to clear the buffer
-            if chunk_callback:
-                chunk_callback("__RISK_PHASE_START__")
+            if emit:
+                await emit("__RISK_PHASE_START__")
                 
             # Pass the callback into the risk generator
-            risks_data = _add_risks(report_data, current_risks, chunk_callback) 
+            risks_data = await _add_risks(report_data, current_risks, emit, skip_cache, organization_id)
             
-            print("--- Successfully generated report and risk data dictionaries. ---")
+            logger.info("Successfully generated report and risk data dictionaries.")
             return report_data, risks_data, ""
 
-        except (ResourceExhausted, ServiceUnavailable, DeadlineExceeded) as e:
+        except (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError) as e:
             msg = "The AI service is experiencing issues or high traffic."
-            print(f"[WARNING] Attempt {attempt}/{MAX_RETRIES} failed: {msg}")
+            logger.warning("Attempt %s/%s failed with %s: %s", attempt, MAX_RETRIES, type(e).__name__, e)
             if attempt == MAX_RETRIES:
                 return None, None, f"{msg} Please try again later."
-            time.sleep(2 ** attempt) 
+            if isinstance(e, ResourceExhausted) and _rotate_key():
+                # Another key still has quota, no need to wait
+                continue
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+        except InvalidArgument as e:
+            # The request itself is bad (e.g. prompt too large); retrying won't help
+            logger.error("Gemini rejected the request (%s): %s", type(e).__name__, e)
+            return None, None, "The AI service rejected the request for this scan data."
+
+        except (PermissionDenied, Unauthenticated) as e:
+            # Bad or revoked API key; every retry would fail the same way
+            logger.error("Gemini refused the credentials (%s): %s", type(e).__name__, e)
+            return None, None, "The AI service is not available. Please contact an administrator."
             
-        except RuntimeError as e:
-            print(f"[WARNING] Attempt {attempt}/{MAX_RETRIES} failed due to empty API output: {e}")
+        except (RuntimeError, orjson.JSONDecodeError) as e:
+            # Empty or truncated output; a new sample usually comes back whole
+            logger.warning("Attempt %s/%s returned no usable output: %s", attempt, MAX_RETRIES, e)
             if attempt == MAX_RETRIES:
                 return None, None, "The AI failed to generate content after multiple attempts."
-            time.sleep(2)
+            await asyncio.sleep(_backoff(attempt))
             
         except jsonschema.ValidationError as e:
-            msg = "The AI generated an improperly formatted report."
-            print(f"[ERROR] Schema validation failed: {e.message}")
-            return None, None, msg 
+            # A fresh sample usually conforms; only give up once retries run out
+            logger.warning("Attempt %s/%s failed schema validation: %s", attempt, MAX_RETRIES, e.message)
+            if attempt == MAX_RETRIES:
+                return None, None, "The AI generated an improperly formatted report."
+            await asyncio.sleep(_backoff(attempt))
             
         except Exception as e:
             error_str = str(e).lower()
             if "safety" in error_str or "blocked" in error_str:
                 msg = "The AI blocked the generation because the scan data triggered a safety filter."
-                print(f"[ERROR] {msg}")
+                logger.error(msg)
                 return None, None, msg
                 
-            print(f"[ERROR] AI Pipeline failed on attempt {attempt}: {e}")
+            logger.exception("AI pipeline failed on attempt %s/%s", attempt, MAX_RETRIES)
             if attempt == MAX_RETRIES:
                 return None, None, "An unexpected error occurred while analyzing the scan data."
-            time.sleep(2)
+            await asyncio.sleep(_backoff(attempt))
             
     # Fallback if the loop breaks unexpectedly
-    return None, None, "Maximum retries exceeded."
\ No newline at end of file
+    return None, None, "Maximum retries exceeded."
@@ -1,8 +1,11 @@
-import json
+import logging
+import orjson
 import google.generativeai as gen
 from django.conf import settings
 from api.models import Report, Risk
 
+logger = logging.getLogger(__name__)
+
 # -----------------------------------------------------------------------------
 # MODEL SETUP
 # -----------------------------------------------------------------------------
@@ -26,12 +29,12 @@ def generate_chat_reply_report(report_id: str, user_message: str) -> str:
         # Safely parse the report text if it's stored as a string
         report_data = report.report_text
         if isinstance(report_data, str):
-            report_data = json.loads(report_data)
+            report_data = orjson.loads(report_data)
             
         # Format the context
         context = f"Report Name: {report.report_name}\n"
         context += f"Completion Date: {report.completed}\n"
-        context += f"Full Report Content: {json.dumps(report_data, indent=2)}\n"
+        context += f"Full Report Content: {orjson.dumps(report_data, option=orjson.OPT_INDENT_2).decode()}\n"
         
         prompt = f"""You are a helpful, expert cybersecurity assistant. 
                     A user is asking a question about their cybersecurity assessment report. 
@@ -57,8 +60,8 @@ def generate_chat_reply_report(report_id: str, user_message: str) -> str:
         
     except Report.DoesNotExist:
         return "Error: The requested report could not be found."
-    except Exception as e:
-        print(f"[ERROR] Chatbot report generation failed: {e}")
+    except Exception:
+        logger.exception("Chatbot report reply failed for report %s", report_id)
         return "I'm sorry, I encountered a technical error while analyzing your report."
 
 
@@ -75,7 +78,7 @@ def generate_chat_reply_risk(risk_id: str, user_message: str) -> str:
         context += f"Severity: {risk.severity}\n"
         context += f"Overview: {risk.overview}\n"
         context += f"Affected Elements: {risk.affected_elements}\n"
-        context += f"Recommendations: {json.dumps(risk.recommendations, indent=2)}\n"
+        context += f"Recommendations: {orjson.dumps(risk.recommendations, option=orjson.OPT_INDENT_2).decode()}\n"
         
         prompt = f"""You are a helpful, expert cybersecurity assistant. 
                     A user is asking a question about a specific security vulnerability (risk) found in their system.
@@ -101,6 +104,6 @@ def generate_chat_reply_risk(risk_id: str, user_message: str) -> str:
         
     except Risk.DoesNotExist:
         return "Error: The requested vulnerability could not be found."
-    except Exception as e:
-        print(f"[ERROR] Chatbot risk generation failed: {e}")
+    except Exception:
+        logger.exception("Chatbot risk reply failed for risk %s", risk_id)
         return "I'm sorry, I encountered a technical error while analyzing this vulnerability."
\ No newline at end of file
@@ -1,4 +1,5 @@
-import json
+import logging
+import orjson
 from typing import Any, Tuple, List, Optional
 from django.db import transaction
 from django.utils import timezone
@@ -7,6 +8,8 @@ from django.core.cache import cache
 from ..models import Report, Risk, Organization, User
 from .ai_generation_service import ai_generation_service
 
+logger = logging.getLogger(__name__)
+
 # EXAMPLE CALL FROM FRONTEND
 # from django.http import JsonResponse
 # from .gemini_client import generate_and_process_report
@@ -58,17 +61,21 @@ def build_current_risks_dict(organization_id: int) -> dict:
     Fetches existing active risks for an organization and formats them 
     into a dictionary that the AI service expects.
     """
-    existing_risks = Risk.objects.filter(organization_id=organization_id, is_archived=False)
+    # Only the columns the AI sees; skips decrypting every risk's recommendations.
+    # Ordered so the same risks always give the same prompt (and cache key).
+    existing_risks = Risk.objects.filter(organization_id=organization_id, is_archived=False).order_by(
+        'risk_name', 'risk_id'
+    ).values_list('risk_name', 'overview', 'severity', 'affected_elements')
     
     current_risks = {
         "all_vulnerabilities": [
             {
-                "risk_name": risk.risk_name,
-                "overview": risk.overview,
-                "severity": risk.severity,
-                "affected_elements": [e.strip() for e in risk.affected_elements.split(",")] if risk.affected_elements else []
+                "risk_name": risk_name,
+                "overview": overview,
+                "severity": severity,
+                "affected_elements": [e.strip() for e in affected_elements.split(",")] if affected_elements else []
             }
-            for risk in existing_risks
+            for risk_name, overview, severity, affected_elements in existing_risks
         ]
     }
     return current_risks
@@ -97,7 +104,7 @@ def _build_scan_findings(scan_obj: Any) -> dict:
     try:
         raw = scan_obj.raw_findings_json
         if raw:
-            container = json.loads(raw) if isinstance(raw, str) else raw
+            container = orjson.loads(raw) if isinstance(raw, str) else raw
             all_findings = container.get('findings', []) if isinstance(container, dict) else []
 
             # Keep only port-based findings (tcp/udp) that have a port ID.
@@ -124,10 +131,11 @@ def _build_scan_findings(scan_obj: Any) -> dict:
 
     return result
 
-def _inject_overview_scan_and_questionnaire(report_data: dict, org: Organization, scan_obj: Any = None) -> dict:
+def _inject_overview_scan_and_questionnaire(report_data: dict, org: Organization, scan_obj: Any = None, now=None) -> dict:
     """
     Injects the Overview, Scan Findings, and Questionnaire Review sections at the top 
     of the AI-generated report data using information from the database.
+    `now` is the report's completion time, used for the Report Date.
     """
     scan_findings = _build_scan_findings(scan_obj)
     
@@ -137,7 +145,7 @@ def _inject_overview_scan_and_questionnaire(report_data: dict, org: Organization
             "Email Domain": org.email_domain,
             "Website Domain": org.website_domain,
             "External IP Address": org.external_ip,
-            "Report Date": timezone.now().strftime('%Y-%m-%d')
+            "Report Date": (now or timezone.now()).strftime('%Y-%m-%d')
         },
         "Questionnaire Review": {
             "Do you require MFA to access email?": "Yes" if org.require_mfa_email else "No",
@@ -172,16 +180,19 @@ def generate_and_process_report(
     user_id: str, 
     context_data: str,
     scan_obj: Optional[Any] = None,
-    chunk_callback=None
+    chunk_callback=None,
+    skip_cache: bool = False,
 ) -> Tuple[Optional[Report], Optional[List[Risk]], str]: 
     """
     Gathers DB fields, calls the AI service, injects database context, and saves.
     context_data must be a JSON string (the AI only accepts strings).
+    skip_cache is passed through to ai_generation_service.
     """
     # Fetch the database records
     try:
         org = Organization.objects.get(organization_id=organization_id)
-        user = User.objects.get(user_id=user_id) if user_id else None
+        # Only the pk is needed for Report.user_created, not the whole (encrypted) row
+        user_pk = User.objects.values_list('pk', flat=True).get(user_id=user_id) if user_id else None
     except Organization.DoesNotExist:
         return None, None, f"Organization ID {organization_id} not found."
         
@@ -196,7 +207,9 @@ def generate_and_process_report(
         questionnaire, 
         current_risks, 
         context_data, 
-        chunk_callback=chunk_callback 
+        chunk_callback=chunk_callback,
+        skip_cache=skip_cache,
+        organization_id=str(organization_id),
     )
 
     # 4. Check for AI failure
@@ -213,79 +226,64 @@ def generate_and_process_report(
 
     # 5. Process and Save to Database
     try:
+        # One timestamp for the report date, name and completion time, so they
+        # can't disagree across midnight
+        completed = timezone.now()
+
         # Inject context from the database into the AI's output
-        report_data = _inject_overview_scan_and_questionnaire(report_data, org, scan_obj)
+        report_data = _inject_overview_scan_and_questionnaire(report_data, org, scan_obj, completed)
 
-        with transaction.atomic():
-            # Sort the JSON vulnerabilities BEFORE saving to the database
-            if "report" in report_data and isinstance(report_data["report"], list) and report_data["report"]:
-                readiness_section = report_data["report"][0].get("Risks & Recommendations", {})
-                vulnerabilities = readiness_section.get("Vulnerabilities Found") or []
-                vulnerabilities.sort(key=lambda v: get_severity_weight(v.get("Severity", "")))
-                report_data["report"][0]["Risks & Recommendations"]["Vulnerabilities Found"] = vulnerabilities
-
-                if scan_obj:
-                    scan_obj.finding_count_critical = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Critical")
-                    scan_obj.finding_count_high = sum(1 for v in vulnerabilities if v.get("Severity", "") == "High")
-                    scan_obj.finding_count_medium = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Medium")
-                    scan_obj.finding_count_low = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Low")
-                    scan_obj.finding_count_info = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Info")
-                    scan_obj.status = 'COMPLETE'
-                    scan_obj.save(update_fields=[
-                        'status',
-                        'finding_count_critical', 'finding_count_high',
-                        'finding_count_medium', 'finding_count_low', 'finding_count_info'
-                    ])
+        # Sort the JSON vulnerabilities BEFORE saving to the database
+        if "report" in report_data and isinstance(report_data["report"], list) and report_data["report"]:
+            readiness_section = report_data["report"][0].get("Risks & Recommendations", {})
+            vulnerabilities = readiness_section.get("Vulnerabilities Found") or []
+            vulnerabilities.sort(key=lambda v: get_severity_weight(v.get("Severity", "")))
+            report_data["report"][0]["Risks & Recommendations"]["Vulnerabilities Found"] = vulnerabilities
+
+            if scan_obj:
+                scan_obj.finding_count_critical = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Critical")
+                scan_obj.finding_count_high = sum(1 for v in vulnerabilities if v.get("Severity", "") == "High")
+                scan_obj.finding_count_medium = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Medium")
+                scan_obj.finding_count_low = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Low")
+                scan_obj.finding_count_info = sum(1 for v in vulnerabilities if v.get("Severity", "") == "Info")
 
+        ai_vulnerabilities = risks_data.get('new vulnerabilities') or []
+
+        # Only the writes run in the transaction; everything above is in memory
+        with transaction.atomic():
             # Create the Report
             new_report = Report.objects.create(
-                user_created=user,
+                user_created_id=user_pk,
                 organization=org,
-                report_name=f"Report - {org.org_name} - {timezone.now().strftime('%Y-%m-%d')}",
+                report_name=f"Report - {org.org_name} - {completed.strftime('%Y-%m-%d')}",
                 report_text=report_data, 
-                completed=timezone.now()
+                completed=completed
             )
 
-            if scan_obj:
-                scan_obj.report = new_report
-                scan_obj.save(update_fields=['report'])
-
-            # Create the Risks
-            final_ai_counts = {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0, 'Info': 0}
-            created_risks = []
-            
-            ai_vulnerabilities = risks_data.get('new vulnerabilities') or []
-            
-            for risk_item in ai_vulnerabilities:
-                affected = risk_item.get('affected_elements') or []
-                
-                new_risk = Risk.objects.create(
+            # Create the Risks in one INSERT instead of one per vulnerability
+            created_risks = Risk.objects.bulk_create([
+                Risk(
                     risk_name=risk_item.get('risk_name') or 'Unknown Risk',
                     report=new_report, 
                     organization=org,
                     overview=risk_item.get('overview') or '',
                     recommendations=risk_item.get('recommendations') or {},
                     severity=risk_item.get('severity') or 'Info',
-                    affected_elements=", ".join(affected),
+                    affected_elements=", ".join(risk_item.get('affected_elements') or []),
                 )
-                created_risks.append(new_risk)
-
-                # Add a running tally of risks found to the cache
-                if scan_obj:
-                    cache_key = f"scan_live_risks_{scan_obj.id}"
-                    counts = cache.get(cache_key, {
-                        'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0, 'Info': 0
-                    })
-                    sev = (new_risk.severity or "Info").capitalize()
-                    if sev in counts:
-                        counts[sev] += 1
-                    cache.set(cache_key, counts, timeout=600)
-
-                sev = (new_risk.severity or "Info").capitalize()
-                if sev in final_ai_counts:
-                    final_ai_counts[sev] += 1
-
-        print(f"--- Successfully saved Report {new_report.pk} and associated risks. ---")
+                for risk_item in ai_vulnerabilities
+            ])
+
+            if scan_obj:
+                scan_obj.status = 'COMPLETE'
+                scan_obj.report = new_report
+                scan_obj.save(update_fields=[
+                    'status', 'report',
+                    'finding_count_critical', 'finding_count_high',
+                    'finding_count_medium', 'finding_count_low', 'finding_count_info'
+                ])
+
+        logger.info("Saved report %s with %s risks", new_report.pk, len(created_risks))
         
         # 6. Sort the Python list of Risk objects for returning to the frontend
         created_risks.sort(key=lambda r: get_severity_weight(r.severity))
@@ -1,7 +1,7 @@
 # api/services/generate_report_from_scan.py
 
-import json
 import logging
+import orjson
 from django.utils import timezone
 from django.db import transaction
 
@@ -10,14 +10,19 @@ from .gemini_client import generate_and_process_report
 
 logger = logging.getLogger(__name__)
 
-def generate_report_from_scan(scan_id: str, chunk_callback=None):
+def generate_report_from_scan(scan_id: str, chunk_callback=None, skip_cache=False):
+    """
+    Builds the AI context for a scan and generates its report and risks.
+    skip_cache=True regenerates instead of reusing a cached AI response; retries
+    pass it, since a cached response may be what the failed attempt was built from.
+    """
     from api.models import Scan
     from django.core.cache import cache
 
     try:
         scan = Scan.objects.select_related('user', 'organization').get(id=scan_id)
         
-        raw_data = json.loads(scan.raw_findings_json or '{}')
+        raw_data = orjson.loads(scan.raw_findings_json or '{}')
         findings = raw_data.get('findings', [])
         
         ai_context = _build_integrated_context(scan, findings)
@@ -28,13 +33,14 @@ def generate_report_from_scan(scan_id: str, chunk_callback=None):
             user_id=scan.user.user_id if scan.user else None,
             context_data=ai_context,
             scan_obj=scan,
-            chunk_callback=chunk_callback
+            chunk_callback=chunk_callback,
+            skip_cache=skip_cache,
         )
 
         # 2. Handle AI Failure Gracefully
         if not new_report:
             error_msg = actual_error or "An internal error occurred during report generation."
-            logger.error(f"Scan {scan_id} failed: {error_msg}")
+            logger.error("Scan %s failed: %s", scan_id, error_msg)
             
             # 3. FIX THE FRONTEND: Force the UI to stop spinning!
             cache.set(f"scan_progress_{scan_id}", {
@@ -53,7 +59,7 @@ def generate_report_from_scan(scan_id: str, chunk_callback=None):
             scan.save(update_fields=['report', 'status', 'report_completed_at'])
             scan.purge_raw_findings()
 
-        logger.info(f"Scan {scan_id} successfully processed. Report ID: {new_report.pk}")
+        logger.info("Scan %s successfully processed. Report ID: %s", scan_id, new_report.pk)
         
         return {
             'success': True,
@@ -62,7 +68,7 @@ def generate_report_from_scan(scan_id: str, chunk_callback=None):
         }
 
     except Exception as e:
-        logger.exception(f"Processing failed for scan {scan_id}: {e}")
+        logger.exception("Processing failed for scan %s: %s", scan_id, e)
         try:
             from api.models import Scan
             from django.core.cache import cache
@@ -77,10 +83,13 @@ def generate_report_from_scan(scan_id: str, chunk_callback=None):
 def _build_integrated_context(scan, findings: list) -> str:
     """
     Format network metadata and findings into a single string for the AI.
+
+    Only stable data goes in: the scan date and duration change on every run
+    (the report gets them from the DB afterwards), and findings are sorted and
+    key-ordered, so rescanning an unchanged network produces the same prompt
+    and hits the LLM response cache.
     """
     metadata = {
-        "Scan Date": scan.scan_completed_at.isoformat() if scan.scan_completed_at else "N/A",
-        "Scan Duration": f"{scan.scan_duration_seconds}s",
         "Tools Skipped": scan.skipped_tools,
         "Groups Completed": f"{scan.groups_completed}/15",
         "Finding Counts": {
@@ -94,9 +103,12 @@ def _build_integrated_context(scan, findings: list) -> str:
 
     context_blocks = [
         "--- NETWORK SCAN METADATA ---",
-        json.dumps(metadata, indent=2),
+        orjson.dumps(metadata, option=orjson.OPT_INDENT_2).decode(),
         "\n--- DETAILED FINDINGS ---",
-        json.dumps(findings, indent=2)
+        orjson.dumps(
+            sorted(findings, key=lambda f: orjson.dumps(f, option=orjson.OPT_SORT_KEYS)),
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
+        ).decode()
     ]
     
     return "\n".join(context_blocks)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Response cache for the Gemini generators in ai_generation_service.
+
+Two tiers:
+  - Exact match   → SHA-256 of every prompt part, looked up in Django's cache.
+  - Semantic match → (optional) embedding of the variable part of the prompt,
+                     compared by cosine similarity against recent entries of
+                     the same organization. A near-identical scan from another
+                     organization must never get its report, so the semantic
+                     tier is only used for scoped calls.
+
+Cached responses are Fernet-encrypted with the same key as the encrypted model
+fields, since they contain the same report data that is encrypted at rest in
+the Report/Risk tables.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+import google.ai.generativelanguage as glm
+import google.generativeai as gen
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import decrypt_value, encrypt_value
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = 'models/text-embedding-004'
+
+# Max number of embeddings kept per namespace for the semantic tier
+SEMANTIC_INDEX_SIZE = 256
+
+# Running event loop -> embedding client; see _embed_client
+_embed_clients = {}
+_embed_lock = threading.Lock()
+
+
+def make_key(namespace: str, parts: Iterable[str]) -> str:
+    """Builds the exact-match cache key for a namespace and its prompt parts."""
+    # SHA-256 over BLAKE2b on purpose: with SHA extensions (any recent x86/ARM
+    # server) it hashes a 500 KB prompt in ~0.4 ms, about twice as fast.
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        # Separator so ("ab", "c") and ("a", "bc") don't collide
+        digest.update(b'\x00')
+    return f"llm_cache:{namespace}:{digest.hexdigest()}"
+
+
+def _cosine(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+async def _load(key: str) -> Optional[Any]:
+    try:
+        token = await cache.aget(key)
+    except Exception as e:
+        # A cache outage should cost a Gemini call, not fail the report
+        logger.warning("LLM cache unavailable: %s", e)
+        return None
+    if token is None:
+        return None
+    try:
+        return orjson.loads(decrypt_value(token))
+    except Exception as e:
+        logger.warning("Discarding unreadable LLM cache entry %s: %s", key, e)
+        await cache.adelete(key)
+        return None
+
+
+async def _store(key: str, value: Any) -> None:
+    try:
+        token = encrypt_value(orjson.dumps(value).decode())
+        await cache.aset(key, token, timeout=settings.LLM_CACHE_TIMEOUT)
+    except Exception as e:
+        # e.g. no FIELD_ENCRYPTION_KEY in local dev: just don't cache
+        logger.warning("LLM response not cached: %s", e)
+
+
+def _embed_client() -> glm.GenerativeServiceAsyncClient:
+    """
+    One embedding client per event loop, for the same reason as
+    ai_generation_service._loop_models: a batch embeds a prompt per org, and
+    those lookups should share a channel instead of each opening its own.
+    """
+    loop = asyncio.get_running_loop()
+    with _embed_lock:
+        client = _embed_clients.get(loop)
+        if client is None:
+            for stale in [other for other in _embed_clients if other.is_closed()]:
+                del _embed_clients[stale]
+            client = _embed_clients[loop] = glm.GenerativeServiceAsyncClient(
+                client_options={"api_key": settings.API_KEY}
+            )
+    return client
+
+
+async def _embed(text: str) -> Optional[list]:
+    try:
+        result = await gen.embed_content_async(model=EMBEDDING_MODEL, content=text, client=_embed_client())
+        return result['embedding']
+    except Exception as e:
+        logger.warning("Embedding failed, skipping semantic cache: %s", e)
+        return None
+
+
+async def _semantic_lookup(namespace: str, vector: list) -> Optional[str]:
+    index = await cache.aget(f"llm_cache_index:{namespace}") or []
+    best_key, best_score = None, settings.LLM_SEMANTIC_CACHE_THRESHOLD
+    for key, other in index:
+        score = _cosine(vector, other)
+        if score >= best_score:
+            best_key, best_score = key, score
+    return best_key
+
+
+async def _semantic_add(namespace: str, key: str, vector: list) -> None:
+    index_key = f"llm_cache_index:{namespace}"
+    index = await cache.aget(index_key) or []
+    index = [entry for entry in index if entry[0] != key]
+    index.append((key, vector))
+    await cache.aset(index_key, index[-SEMANTIC_INDEX_SIZE:], timeout=settings.LLM_CACHE_TIMEOUT)
+
+
+async def get_or_call(
+    namespace: str,
+    parts: Iterable[str],
+    call_fn: Callable[[], Awaitable[Any]],
+    semantic_text: Optional[str] = None,
+    on_hit: Optional[Callable[[Any], Awaitable[None]]] = None,
+    refresh: bool = False,
+    scope: Optional[str] = None,
+) -> Any:
+    """
+    Returns the cached response for `parts`, or awaits call_fn() and caches it.
+
+    Args:
+        namespace: Separates unrelated prompts (e.g. 'report' and 'risks').
+        parts: Everything that determines the response (model, prompt, context...).
+        call_fn: Coroutine factory that performs the real Gemini call.
+        semantic_text: The variable part of the prompt to embed for the semantic tier.
+        on_hit: Optional coroutine called with the cached value on a hit.
+        refresh: Skip the lookup and call Gemini, replacing the cached response.
+        scope: Tenant (organization id) the response belongs to. Entries and the
+            semantic index are kept per scope; unscoped calls skip the semantic tier.
+    """
+    if scope:
+        namespace = f"{namespace}:{scope}"
+    key = make_key(namespace, parts)
+
+    cached = None if refresh else await _load(key)
+    if cached is not None:
+        logger.info("LLM cache hit (%s, exact)", namespace)
+        if on_hit:
+            await on_hit(cached)
+        return cached
+
+    vector = None
+    if semantic_text and scope and settings.LLM_SEMANTIC_CACHE_ENABLED:
+        vector = await _embed(semantic_text)
+        if vector and not refresh:
+            similar_key = await _semantic_lookup(namespace, vector)
+            cached = await _load(similar_key) if similar_key else None
+            if cached is not None:
+                logger.info("LLM cache hit (%s, semantic)", namespace)
+                if on_hit:
+                    await on_hit(cached)
+                return cached
+
+    result = await call_fn()
+
+    await _store(key, result)
+    if vector:
+        await _semantic_add(namespace, key, vector)
+
+    return result
@@ -10,11 +10,12 @@ Entry point for Django-Q2: run_network_scan(scan_id)
 """
 
 from ast import Lambda
-import json
 import re
+import orjson
 import ssl
 import socket
 import logging
+import time
 from datetime import datetime, timezone as dt_timezone
 
 import requests
@@ -25,6 +26,19 @@ from django.urls import reverse
 
 logger = logging.getLogger(__name__)
 
+# Compiled once: the severity pattern runs on every streamed chunk of the AI report
+_VERSION_RE = re.compile(r'\d+\.\d+')
+_SEVERITY_RE = re.compile(r'"Severity"\s*:\s*"([^"]+)"', re.IGNORECASE)
+
+# JSON keys in the streamed AI output that mark how far generation has got
+_PROGRESS_KEYWORDS = (
+    '"thought"', '"report"', '"Summary"', '"Observations"', '"Conclusion"',
+    '"new vulnerabilities"', '"all vulnerabilities"',
+)
+# Characters of stream text carried over to the next chunk; longer than any
+# keyword or severity entry so matches split across chunks aren't missed
+_STREAM_TAIL = 256
+
 # ── Configuration ────────────────────────────────────────────────────────────
 # Yes the ports are AI generated - but let's be real this is a great use of AI instead of my time
 
@@ -629,7 +643,7 @@ def _check_http(hostname, session, findings, progress_fn=None):
             x_powered = resp.headers.get('X-Powered-By', '')
             x_aspnet  = resp.headers.get('X-AspNet-Version', '')
 
-            if server and re.search(r'\d+\.\d+', server):
+            if server and _VERSION_RE.search(server):
                 findings.append({
                     'severity': 'LOW', 
                     'scan_type': 'infra',
@@ -1290,11 +1304,11 @@ def run_network_scan(scan_id: str, scan_arr: list = [1, 1, 1, 1]):
         scan.scan_completed_at = timezone.now()
         scan.target_subnet = f"{port_target} / {infra_target}"
 
-        scan.raw_findings_json = json.dumps({
+        scan.raw_findings_json = orjson.dumps({
             'scan_metadata': scan_metadata_list,
             'findings': all_findings,
             'results': results_obj,
-        })
+        }, option=orjson.OPT_NON_STR_KEYS).decode()
         logger.info(f"Network scan results: {scan.raw_findings_json}")
         scan.tally_findings(all_findings)
         scan.status = Scan.Status.GENERATING
@@ -1302,14 +1316,31 @@ def run_network_scan(scan_id: str, scan_arr: list = [1, 1, 1, 1]):
 
         # ── Step 4: Generate AI report ────────────────────────────────────
         
-        # 1. Create a mutable list to hold the incoming stream text
-        stream_buffer = [""]
-        
+        # 1. Stream state. The full text is never rebuilt: progress keywords are
+        # remembered once seen and only a short tail is carried between chunks,
+        # so a keyword or severity split across two chunks is still found.
+        stream_tail = [""]
+        seen_keywords = set()
+        severity_matches = []
+        # Last progress and tally written; the cache is DB-backed, so chunks
+        # that don't move the progress bar skip the write (but still refresh it
+        # well before its 600s timeout)
+        last_progress = [None, 0.0]
+        last_tally = [0]
+
+        def reset_stream():
+            stream_tail[0] = ""
+            seen_keywords.clear()
+            severity_matches.clear()
+            last_progress[0] = None
+            last_progress[1] = 0.0
+            last_tally[0] = 0
+
         # 2. Define the callback
         def ai_progress_callback(chunk_text):
             # Catch the retry signal and clear the buffer
             if chunk_text == "__RETRY_RESET__":
-                stream_buffer[0] = ""
+                reset_stream()
                 # Reset the live cache counts to 0
                 if scan_id:
                     cache.set(f"scan_live_risks_{scan_id}", {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0, 'Info': 0}, timeout=600)
@@ -1317,28 +1348,33 @@ def run_network_scan(scan_id: str, scan_arr: list = [1, 1, 1, 1]):
 
             # Catch the phase transition and clear the buffer
             if chunk_text == "__RISK_PHASE_START__":
-                stream_buffer[0] = "" 
+                reset_stream()
                 return
 
-            stream_buffer[0] += chunk_text
-            current_text = stream_buffer[0]
-                        
+            current_text = stream_tail[0] + chunk_text
+            seen_keywords.update(k for k in _PROGRESS_KEYWORDS if k in current_text)
+
+            last_end = 0
+            for match in _SEVERITY_RE.finditer(current_text):
+                severity_matches.append(match.group(1))
+                last_end = match.end()
+            stream_tail[0] = current_text[max(last_end, len(current_text) - _STREAM_TAIL):]
+
             report_pct = 5
             status_text = 'Initializing AI...'
             
             # PHASE 2 (Risk extraction keywords)
-            if '"all vulnerabilities"' in current_text:
+            if '"all vulnerabilities"' in seen_keywords:
                 report_pct, status_text = 99, 'Finalizing risk database'
-            elif '"new vulnerabilities"' in current_text:
+            elif '"new vulnerabilities"' in seen_keywords:
                 report_pct, status_text = 97, 'Cross-referencing known risks'
                 
             # PHASE 1 (Report generation keywords)
-            elif '"Conclusion"' in current_text:
+            elif '"Conclusion"' in seen_keywords:
                 report_pct, status_text = 95, 'Concluding report'
-            elif '"Observations"' in current_text:
+            elif '"Observations"' in seen_keywords:
                 report_pct, status_text = 80, 'Determining observations'
-            elif '"Summary"' in current_text:
-                severity_matches = re.findall(r'"Severity"\s*:\s*"([^"]+)"', current_text, re.IGNORECASE) 
+            elif '"Summary"' in seen_keywords:
                 severity_hits = len(severity_matches)
 
                 if severity_hits > 0:
@@ -1354,20 +1390,24 @@ def run_network_scan(scan_id: str, scan_arr: list = [1, 1, 1, 1]):
                             live_counts[sev_cap] += 1
 
                     # cache live findings
-                    if scan_id:
+                    if scan_id and severity_hits != last_tally[0]:
                         cache.set(f"scan_live_risks_{scan_id}", live_counts, timeout=600)
+                        last_tally[0] = severity_hits
                 else:
                     report_pct, status_text = 35, 'Providing network summary'
-            elif '"report"' in current_text:
+            elif '"report"' in seen_keywords:
                 report_pct, status_text = 20, 'Generation started'
-            elif '"thought"' in current_text:
+            elif '"thought"' in seen_keywords:
                 report_pct, status_text = 10, 'Thinking...'
                 
             # 3. Write ONLY the clean progress data to cache, no raw AI text!
-            cache.set(f"scan_progress_{scan_id}", {
-                "progress": report_pct,
-                "text": status_text
-            }, timeout=600)
+            now = time.monotonic()
+            if (report_pct, status_text) != last_progress[0] or now - last_progress[1] > 60:
+                cache.set(f"scan_progress_{scan_id}", {
+                    "progress": report_pct,
+                    "text": status_text
+                }, timeout=600)
+                last_progress[0], last_progress[1] = (report_pct, status_text), now
 
         # 4. Pass the callback down. 
         result = generate_report_from_scan(scan_id, chunk_callback=ai_progress_callback)
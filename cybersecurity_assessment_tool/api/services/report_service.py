@@ -60,9 +60,15 @@ def list_reports_by_user(user: User):
         user (User): The User instance to filter by.
 
     Returns:
-        django.db.models.query.QuerySet: A queryset of Report objects.
+        django.db.models.query.QuerySet: A queryset of Report objects, newest
+        first, with report_text deferred until it is accessed.
     """
-    return Report.objects.filter(user_created=user).order_by('-date_created')
+    return (
+        Report.objects.summaries()
+        .filter(user_created=user)
+        .select_related('organization')
+        .order_by('-started')
+    )
 
 def get_report_file_content(report_id: str) -> str | None:
     """
@@ -75,15 +81,17 @@ def get_report_file_content(report_id: str) -> str | None:
         bytes | None: The JSON content converted to JSON formatted string of the file, or None if the report/file is not found.
     """
     try:
-        report = Report.objects.get(pk=report_id)
-        
+        # Only the text column is needed; skip building the Report instance
+        report_text = Report.objects.values_list('report_text', flat=True).get(pk=report_id)
+
         # The report_text is a JSONField, which Django typically converts to 
         # a Python dict/list. We need to convert it back to a JSON formatted string.
-        if report.report_text is not None:
-            # Use json.dumps to convert the Python object back to a JSON string
-            return json.dumps(report.report_text, indent=4)
+        if report_text is not None:
+            # Stdlib json on purpose: this is the downloaded file, and users
+            # get the same 4-space indented, ASCII-escaped format as before
+            return json.dumps(report_text, indent=4)
         else:
             return None
 
     except ObjectDoesNotExist:
-        return None
\ No newline at end of file
+        return None
@@ -1,11 +1,35 @@
-from unittest.mock import patch
-
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import jsonschema
+import orjson
+from asgiref.sync import async_to_sync
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.core import mail
+from django.utils import timezone
+from google.api_core.exceptions import (
+    InvalidArgument,
+    NotFound,
+    PermissionDenied,
+    ResourceExhausted,
+    ServiceUnavailable,
+)
+from google.protobuf import duration_pb2
+from google.rpc import error_details_pb2
 
-from api.models import Invitation, Organization, User, Report, Risk
+from api.models import Invitation, Organization, User, Report, Risk, Scan
+from api.pagination import DefaultLimitOffsetPagination
+from api.services import ai_generation_service as service
+from api.services import gemini_client, llm_cache
+from api.services.generate_report_from_scan import _build_integrated_context, generate_report_from_scan
+from api.services.report_service import get_report_file_content, list_reports_by_user
 
 class DatabaseEncryptionTests(TestCase):
     def setUp(self):
@@ -92,6 +116,258 @@ class DatabaseEncryptionTests(TestCase):
         self.assertEqual(fetched_risk.recommendations["easy_fix"], "Apply the latest security patch.")
 
 
+class APITenancyTests(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(
+            org_name="Wayne Enterprises",
+            email_domain="wayne.com",
+            website_domain="wayne.com",
+            external_ip="198.51.100.14"
+        )
+        self.other_org = Organization.objects.create(
+            org_name="LexCorp",
+            email_domain="lexcorp.com",
+            website_domain="lexcorp.com",
+            external_ip="203.0.113.7"
+        )
+        self.user = User.objects.create_user(
+            first_name="Bruce",
+            last_name="Wayne",
+            email="bwayne@wayne.com",
+            username="bwayne",
+            password="securepassword123",
+            organization=self.org
+        )
+
+    def test_report_summaries_defer_report_text(self):
+        """Test that list querysets skip the encrypted report body but can still load it on access."""
+        report = Report.objects.create(
+            report_name="Q2 Security Audit",
+            user_created=self.user,
+            organization=self.org,
+            report_text={"Overview": {}}
+        )
+
+        summary = Report.objects.summaries().get(report_id=report.report_id)
+
+        self.assertIn('report_text', summary.get_deferred_fields())
+        self.assertEqual(summary.report_text, {"Overview": {}})
+
+    def test_list_reports_by_user_is_newest_first(self):
+        """Test that list_reports_by_user orders by start time and defers report_text."""
+
+        older = Report.objects.create(report_name="Older", user_created=self.user, organization=self.org)
+        newer = Report.objects.create(report_name="Newer", user_created=self.user, organization=self.org)
+        Report.objects.filter(pk=older.pk).update(started=timezone.now() - timedelta(days=1))
+
+        reports = list(list_reports_by_user(self.user))
+
+        self.assertEqual([r.pk for r in reports], [newer.pk, older.pk])
+        self.assertIn('report_text', reports[0].get_deferred_fields())
+
+    def test_report_api_list_omits_report_text(self):
+        """Test that the report list endpoint leaves out report_text while retrieve keeps it."""
+        report = Report.objects.create(
+            report_name="Q3 Security Audit",
+            user_created=self.user,
+            organization=self.org,
+            report_text={"Overview": {}}
+        )
+        self.client.force_login(self.user)
+
+        listed = self.client.get('/api/reports/').json()['results']
+        detail = self.client.get(f'/api/reports/{report.report_id}/').json()
+
+        self.assertEqual(listed[0]['report_name'], "Q3 Security Audit")
+        self.assertNotIn('report_text', listed[0])
+        self.assertEqual(detail['report_text'], {"Overview": {}})
+
+    def test_report_file_content_is_decrypted_json(self):
+        """Test that get_report_file_content returns the decrypted report_text as indented JSON."""
+
+        report = Report.objects.create(
+            report_name="Q4 Security Audit",
+            user_created=self.user,
+            organization=self.org,
+            report_text={"Overview": {"Summary": "All clear"}}
+        )
+
+        content = get_report_file_content(report.report_id)
+
+        self.assertEqual(orjson.loads(content), {"Overview": {"Summary": "All clear"}})
+        self.assertIn('\n    "Overview"', content)
+
+    def test_report_api_list_query_count_does_not_grow_with_reports(self):
+        """Test that listing reports costs the same number of queries for one report or many."""
+
+        self.client.force_login(self.user)
+        Report.objects.create(report_name="First", user_created=self.user, organization=self.org)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/api/reports/')
+
+        for i in range(3):
+            Report.objects.create(report_name=f"Report {i}", user_created=self.user, organization=self.org)
+        with self.assertNumQueries(len(one)):
+            listed = self.client.get('/api/reports/').json()
+
+        self.assertEqual(listed['count'], 4)
+        self.assertEqual(len(listed['results']), 4)
+
+    def test_risk_api_list_is_always_paged(self):
+        """Test that a plain risk list request gets the default page, and ?limit= can't exceed the cap."""
+
+        report = Report.objects.create(report_name="Q5 Security Audit", user_created=self.user, organization=self.org)
+        Risk.objects.bulk_create([
+            Risk(
+                risk_name=f"Open port {port}", report=report, organization=self.org, overview="o",
+                recommendations={}, severity="High", affected_elements="host-a",
+            )
+            for port in range(DefaultLimitOffsetPagination.default_limit + 1)
+        ])
+        self.client.force_login(self.user)
+
+        plain = self.client.get('/api/risks/').json()
+        page = self.client.get('/api/risks/?limit=1&offset=1').json()
+        capped = self.client.get('/api/risks/?limit=100000').json()
+
+        self.assertEqual(plain['count'], DefaultLimitOffsetPagination.default_limit + 1)
+        self.assertEqual(len(plain['results']), DefaultLimitOffsetPagination.default_limit)
+        self.assertIsNotNone(plain['next'])
+        self.assertEqual(len(page['results']), 1)
+        self.assertLessEqual(len(capped['results']), DefaultLimitOffsetPagination.max_limit)
+
+    def test_risk_api_only_lists_own_organization(self):
+        """Test that the risk endpoint hides risks belonging to other organizations."""
+        for org in (self.org, self.other_org):
+            report = Report.objects.create(report_name=org.org_name, user_created=self.user, organization=org)
+            Risk.objects.create(
+                risk_name=f"{org.org_name} risk", report=report, organization=org, overview="o",
+                recommendations={}, severity="High", affected_elements="host-a",
+            )
+        self.client.force_login(self.user)
+
+        listed = self.client.get('/api/risks/').json()['results']
+
+        self.assertEqual([r['risk_name'] for r in listed], ["Wayne Enterprises risk"])
+
+    def test_organization_api_only_lists_own_organization(self):
+        """Test that the organization endpoint hides other organizations from non-staff users."""
+        self.client.force_login(self.user)
+
+        listed = self.client.get('/api/organizations/').json()['results']
+        other = self.client.get(f'/api/organizations/{self.other_org.pk}/')
+
+        self.assertEqual([o['org_name'] for o in listed], ["Wayne Enterprises"])
+        self.assertEqual(other.status_code, 404)
+
+    def test_report_api_create_uses_own_organization(self):
+        """Test that a report created through the API belongs to the user's organization."""
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            '/api/reports/',
+            {'report_name': "Q6 Security Audit", 'user_created': str(self.user.pk), 'organization': str(self.other_org.pk)},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        report = Report.objects.get(report_name="Q6 Security Audit")
+        self.assertEqual(report.organization_id, self.org.pk)
+        self.assertEqual(report.user_created_id, self.user.pk)
+
+    def test_user_api_only_lists_own_organization(self):
+        """Test that the user endpoint hides users belonging to other organizations."""
+        outsider = User.objects.create_user(
+            username="lluthor", email="lluthor@lexcorp.com",
+            password="securepassword123", organization=self.other_org
+        )
+        self.client.force_login(self.user)
+
+        listed = self.client.get('/api/users/').json()['results']
+        other = self.client.get(f'/api/users/{outsider.pk}/')
+
+        self.assertEqual([u['username'] for u in listed], ["bwayne"])
+        self.assertEqual(other.status_code, 404)
+
+    def test_user_without_organization_sees_no_tenant_data(self):
+        """Test that users without an organization don't see each other through the API."""
+        loner = User.objects.create_user(
+            username="loner", email="loner@example.com", password="securepassword123"
+        )
+        User.objects.create_user(
+            username="drifter", email="drifter@example.com", password="securepassword123"
+        )
+        self.client.force_login(loner)
+
+        for endpoint in ('/api/users/', '/api/reports/', '/api/risks/', '/api/organizations/'):
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(self.client.get(endpoint).json()['results'], [])
+
+
+class UserModelTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="bwayne@wayne.com",
+            username="bwayne",
+            password="securepassword123",
+        )
+
+    def test_profile_image_path_uses_loaded_user_id(self):
+        """Test that the upload path is built from the user itself, without extra queries."""
+        with self.assertNumQueries(0):
+            upload_to = User._meta.get_field('profile_image').upload_to
+            path = upload_to(self.user, "avatar.png")
+
+        self.assertEqual(path, f"uploads/profile_images/profile_bwayne_{self.user.user_id}.png")
+
+
+@override_settings(
+    STORAGES={
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+    },
+)
+class ReportListViewTests(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(
+            org_name="Wayne Enterprises",
+            email_domain="wayne.com",
+            website_domain="wayne.com",
+            external_ip="198.51.100.14"
+        )
+        self.user = User.objects.create_user(
+            username="bwayne",
+            email="bwayne@wayne.com",
+            password="securepassword123",
+            organization=self.org
+        )
+
+    def test_report_list_page_counts_risks_for_its_reports(self):
+        """Test that the reports page paginates by 10 and shows per-severity counts."""
+        for i in range(12):
+            Report.objects.create(report_name=f"Report {i}", user_created=self.user, organization=self.org)
+        report = Report.objects.order_by('completed').first()
+        for severity in ("Critical", "Critical", "Low"):
+            Risk.objects.create(
+                risk_name=severity, report=report, organization=self.org, overview="o",
+                recommendations={}, severity=severity, affected_elements="host-a",
+            )
+        self.client.force_login(self.user)
+
+        # session, user, organization, permissions (2), count, page: not one per report
+        with self.assertNumQueries(7):
+            first = self.client.get('/reports/').context
+        second = self.client.get('/reports/?page=2').context
+
+        self.assertEqual(first['total_reports'], 12)
+        self.assertEqual(len(first['page_obj']), 10)
+        self.assertEqual(len(second['page_obj']), 2)
+        counted = next(r for r in list(first['page_obj']) + list(second['page_obj']) if r['report_id'] == report.report_id)
+        self.assertEqual((counted['risk_count'], counted['critical_count'], counted['low_count']), (3, 2, 1))
+        self.assertEqual(counted['created_by'], "bwayne")
+
+
 @override_settings(
     GOOGLE_OAUTH_CLIENT_ID='test-google-client-id.apps.googleusercontent.com',
     STORAGES={
@@ -690,4 +966,456 @@ class MicrosoftOAuthFlowTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'id="microsoftSignInButton"', html=False)
-        self.assertNotContains(response, 'Set MICROSOFT_OAUTH_CLIENT_ID to enable Microsoft sign-in')
\ No newline at end of file
+        self.assertNotContains(response, 'Set MICROSOFT_OAUTH_CLIENT_ID to enable Microsoft sign-in')
+
+class LLMResponseCacheTests(TestCase):
+    def test_exact_match_skips_second_gemini_call(self):
+        """A repeated prompt is served from the cache and replayed through on_hit."""
+
+        calls, replayed = [], []
+
+        async def call_fn():
+            calls.append(1)
+            return {"thought": "ok", "new vulnerabilities": []}
+
+        async def on_hit(data):
+            replayed.append(data)
+
+        parts = ("model", "prompt")
+        first = async_to_sync(llm_cache.get_or_call)("risks", parts, call_fn, on_hit=on_hit)
+        second = async_to_sync(llm_cache.get_or_call)("risks", parts, call_fn, on_hit=on_hit)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(replayed, [first])
+
+    def test_refresh_bypasses_and_replaces_cached_response(self):
+        """refresh=True calls Gemini even on a hit, and later lookups get the new response."""
+
+        responses = iter([{"version": 1}, {"version": 2}])
+
+        async def call_fn():
+            return next(responses)
+
+        parts = ("model", "prompt")
+        async_to_sync(llm_cache.get_or_call)("risks", parts, call_fn)
+        refreshed = async_to_sync(llm_cache.get_or_call)("risks", parts, call_fn, refresh=True)
+        cached = async_to_sync(llm_cache.get_or_call)("risks", parts, call_fn)
+
+        self.assertEqual(refreshed, {"version": 2})
+        self.assertEqual(cached, {"version": 2})
+
+    @override_settings(LLM_SEMANTIC_CACHE_ENABLED=True, LLM_SEMANTIC_CACHE_THRESHOLD=0.95)
+    def test_semantic_hits_never_cross_organizations(self):
+        """A near-identical scan only reuses a response cached for the same organization."""
+
+        calls = []
+
+        def call_fn(org):
+            async def call():
+                calls.append(org)
+                return {"org": org}
+            return call
+
+        async def same_vector(text):
+            return [1.0, 0.0, 0.0]
+
+        def lookup(org, prompt):
+            return async_to_sync(llm_cache.get_or_call)(
+                "risks", ("model", prompt), call_fn(org), semantic_text=prompt, scope=org,
+            )
+
+        with patch.object(llm_cache, "_embed", same_vector):
+            first_a = lookup("org-a", "scan of 198.51.100.14")
+            first_b = lookup("org-b", "scan of 198.51.100.15")
+            second_a = lookup("org-a", "scan of 198.51.100.16")
+
+        self.assertEqual(first_a, {"org": "org-a"})
+        self.assertEqual(first_b, {"org": "org-b"})
+        # same organization, similar scan: served from the semantic tier
+        self.assertEqual(second_a, {"org": "org-a"})
+        self.assertEqual(calls, ["org-a", "org-b"])
+
+    def test_embedding_client_is_shared_within_an_event_loop(self):
+        """Embeddings on one loop reuse a client; a new loop gets a new one."""
+
+        async def two_clients():
+            return llm_cache._embed_client(), llm_cache._embed_client()
+
+        with patch.object(llm_cache.glm, "GenerativeServiceAsyncClient", side_effect=lambda **kw: object()), \
+                patch.object(llm_cache, "_embed_clients", {}):
+            first, second = asyncio.run(two_clients())
+            third, _ = asyncio.run(two_clients())
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+
+
+class AIGenerationBatchTests(TestCase):
+    def test_batch_keeps_job_order_and_bounds_concurrency(self):
+        """Results come back in job order with at most `concurrency` pipelines running."""
+
+        running, peak = [0], [0]
+
+        async def fake_pipeline(questionnaire, current_risks, context, chunk_callback=None):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return {"context": context}, {}, ""
+
+        jobs = [
+            {"questionnaire": {}, "current_risks": {}, "context": str(i)}
+            for i in range(5)
+        ]
+        with patch.object(service, "_ai_generation_pipeline", fake_pipeline):
+            results = service.ai_generation_batch(jobs, concurrency=2)
+
+        self.assertEqual([r[0]["context"] for r in results], ["0", "1", "2", "3", "4"])
+        self.assertEqual(peak[0], 2)
+
+
+class GenerateAndProcessReportTests(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(
+            org_name="Wayne Enterprises",
+            email_domain="wayne.com",
+            website_domain="wayne.com",
+            external_ip="198.51.100.14"
+        )
+        self.user = User.objects.create_user(
+            username="bwayne",
+            email="bwayne@wayne.com",
+            password="securepassword123",
+            organization=self.org
+        )
+
+    def test_new_vulnerabilities_are_saved_as_risks(self):
+        """Every new vulnerability from the AI becomes a Risk on the new report, sorted by severity."""
+
+        report_data = {"report": [{"Risks & Recommendations": {"Summary": "s", "Vulnerabilities Found": []}}]}
+        risks_data = {"new vulnerabilities": [
+            {"risk_name": "Open Port: 80", "overview": "o", "severity": "Low", "affected_elements": ["198.51.100.14:80"], "recommendations": {}},
+            {"risk_name": "Open Port: 23", "overview": "o", "severity": "Critical", "affected_elements": ["198.51.100.14:23", "telnet"], "recommendations": {}},
+        ]}
+        with patch.object(gemini_client, "ai_generation_service", return_value=(report_data, risks_data, "")):
+            report, risks, error = gemini_client.generate_and_process_report(self.org.organization_id, self.user.user_id, "context")
+
+        self.assertEqual(error, "")
+        self.assertEqual([r.risk_name for r in risks], ["Open Port: 23", "Open Port: 80"])
+        saved = Risk.objects.get(report=report, risk_name="Open Port: 23")
+        self.assertEqual(saved.affected_elements, "198.51.100.14:23, telnet")
+        self.assertEqual(saved.organization, self.org)
+
+
+    def test_current_risks_are_active_only_and_ordered(self):
+        """The AI sees each active risk once, in a stable order, with its elements split out."""
+
+        report = Report.objects.create(report_name="r", user_created=self.user, organization=self.org)
+        for name, archived in (("Weak TLS", False), ("Open RDP", False), ("Old Finding", True)):
+            Risk.objects.create(
+                risk_name=name, report=report, organization=self.org, overview="o",
+                recommendations={}, severity="High", affected_elements="host-a, host-b", is_archived=archived,
+            )
+
+        current = gemini_client.build_current_risks_dict(self.org.organization_id)["all_vulnerabilities"]
+
+        self.assertEqual([r["risk_name"] for r in current], ["Open RDP", "Weak TLS"])
+        self.assertEqual(current[0]["affected_elements"], ["host-a", "host-b"])
+
+
+    def test_retry_regenerates_without_the_response_cache(self):
+        """Retrying a failed report queues the AI task with skip_cache, and it reaches ai_generation_service."""
+        scan = Scan.objects.create(
+            user=self.user, organization=self.org, status="FAILED",
+            raw_findings_json='{"findings": []}',
+        )
+        self.client.force_login(self.user)
+
+        with patch("api.views_scan.async_task", return_value="task-1") as queued:
+            response = self.client.post(reverse('retry_scan_generation', args=[scan.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queued.call_args.kwargs["skip_cache"])
+
+        with patch.object(gemini_client, "ai_generation_service", return_value=(None, None, "boom")) as generate:
+            generate_report_from_scan(**queued.call_args.kwargs)
+
+        self.assertTrue(generate.call_args.kwargs["skip_cache"])
+
+class IntegratedContextTests(TestCase):
+    def test_rescan_of_unchanged_network_builds_identical_context(self):
+        """Scan timing and finding order don't leak into the prompt, so the response cache can hit."""
+
+        def scan(completed_at, duration):
+            return SimpleNamespace(
+                scan_completed_at=completed_at, scan_duration_seconds=duration,
+                skipped_tools=[], groups_completed=15,
+                finding_count_critical=0, finding_count_high=1, finding_count_medium=0,
+                finding_count_low=1, finding_count_info=0,
+            )
+
+        findings = [
+            {"severity": "HIGH", "portid": "23", "service": "telnet"},
+            {"service": "http", "portid": "80", "severity": "LOW"},
+        ]
+        first = _build_integrated_context(scan(datetime(2026, 1, 5, tzinfo=dt_timezone.utc), 412), findings)
+        second = _build_integrated_context(scan(datetime(2026, 2, 5, tzinfo=dt_timezone.utc), 398), findings[::-1])
+
+        self.assertEqual(first, second)
+        self.assertIn('"telnet"', first)
+
+
+@override_settings(GEMINI_CONTEXT_CACHE_ENABLED=True)
+class GeminiContextCacheTests(TestCase):
+    def setUp(self):
+        service._context_cached_models.clear()
+
+    def _content(self, name, expires_in):
+        content = MagicMock()
+        content.name = name
+        content.expire_time = datetime.now(dt_timezone.utc) + timedelta(seconds=expires_in)
+        return content
+
+    async def _twice(self, service):
+        return (
+            await service._context_cached_model("instruction", "examples"),
+            await service._context_cached_model("instruction", "examples"),
+        )
+
+    def test_context_cache_is_created_once_per_prefix(self):
+        """The static prefix is uploaded once and the cached model reused."""
+
+        cached_content = self._content("cachedContents/abc", 3600)
+        with patch.object(service.gen.caching.CachedContent, "create", return_value=cached_content) as create, \
+                patch.object(service.gen.GenerativeModel, "from_cached_content", side_effect=lambda content: MagicMock()) as from_cached:
+            first, second = async_to_sync(self._twice)(service)
+            on_other_loop, _ = async_to_sync(self._twice)(service)
+
+        # one upload; the model is reused on a loop and rebuilt for a new one
+        self.assertIs(first, second)
+        self.assertIsNot(first, on_other_loop)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(from_cached.call_count, 2)
+        from_cached.assert_called_with(cached_content)
+
+    def test_local_expiry_follows_the_shared_cache(self):
+        """Another worker's cache is dropped locally when Gemini drops it, not a full TTL later."""
+
+        name_key = service._context_cache_key("instruction", "examples")
+        shared = self._content("cachedContents/shared", 120)
+        cache.set(name_key, shared.name)
+        with patch.object(service.gen.caching.CachedContent, "get", return_value=shared), \
+                patch.object(service.gen.caching.CachedContent, "create") as create, \
+                patch.object(service.gen.GenerativeModel, "from_cached_content", side_effect=lambda content: MagicMock()):
+            async_to_sync(service._context_cached_model)("instruction", "examples")
+
+        create.assert_not_called()
+        _, expires_at = service._context_cached_models[name_key]
+        self.assertLessEqual(expires_at - time.monotonic(), 120 - service.CONTEXT_CACHE_MARGIN)
+
+    def test_nearly_expired_shared_cache_is_replaced(self):
+        """A cache Gemini is about to drop isn't reused; a new one is created and shared."""
+
+        name_key = service._context_cache_key("instruction", "examples")
+        cache.set(name_key, "cachedContents/old")
+        old = self._content("cachedContents/old", 30)
+        new = self._content("cachedContents/new", 3600)
+        with patch.object(service.gen.caching.CachedContent, "get", return_value=old) as get, \
+                patch.object(service.gen.caching.CachedContent, "create", return_value=new) as create, \
+                patch.object(service.gen.GenerativeModel, "from_cached_content", side_effect=lambda content: MagicMock()) as from_cached:
+            async_to_sync(service._context_cached_model)("instruction", "examples")
+
+        get.assert_called_once_with(name="cachedContents/old")
+        create.assert_called_once()
+        from_cached.assert_called_once_with(new)
+        self.assertEqual(cache.get(name_key), "cachedContents/new")
+
+    def test_dropped_cache_falls_back_to_full_prompt(self):
+        """A cache Gemini no longer has is evicted and the full prompt sent instead."""
+
+        name_key = service._context_cache_key("instruction", "examples")
+        cached_model = MagicMock()
+        cached_model.generate_content_async = AsyncMock(side_effect=NotFound("cachedContents/gone"))
+        plain_model = MagicMock()
+        plain_model.generate_content_async = AsyncMock(return_value="stream")
+        with patch.object(service.gen.caching.CachedContent, "create", return_value=self._content("cachedContents/gone", 3600)), \
+                patch.object(service.gen.GenerativeModel, "from_cached_content", return_value=cached_model):
+            response = async_to_sync(service._start_stream)(plain_model, "instruction", "examples", "input", {})
+
+        self.assertEqual(response, "stream")
+        plain_model.generate_content_async.assert_awaited_once_with(
+            contents=["examples", "input"], generation_config={}, stream=True,
+        )
+        self.assertNotIn(name_key, service._context_cached_models)
+        self.assertIsNone(cache.get(name_key))
+
+    def test_falls_back_to_full_prompt_when_cache_creation_fails(self):
+        with patch.object(service.gen.caching.CachedContent, "create", side_effect=ValueError("too few tokens")):
+            cached_model = async_to_sync(service._context_cached_model)("instruction", "short")
+
+        self.assertIsNone(cached_model)
+
+
+class AIStreamTests(TestCase):
+    def _stream(self, *texts):
+        async def response():
+            for text in texts:
+                yield SimpleNamespace(text=text)
+        return response()
+
+    def test_stream_is_joined_and_forwarded(self):
+        seen = []
+
+        async def callback(text):
+            seen.append(text)
+
+        text = async_to_sync(service._collect_stream)(self._stream(" ", '{"a"', ": 1}"), callback, "Chunk")
+
+        self.assertEqual(text, ' {"a": 1}')
+        self.assertEqual(seen, [" ", '{"a"', ": 1}"])
+
+    def test_stream_stops_on_non_json_output(self):
+        """Output that can't be a JSON object is abandoned at the first chunk."""
+
+        with self.assertRaises(RuntimeError):
+            async_to_sync(service._collect_stream)(self._stream("I'm sorry", ", I can't"), None, "Chunk")
+
+    def test_abandoned_stream_is_closed(self):
+        """A stream given up on is closed before the error reaches the retry loop."""
+
+        closed = []
+
+        async def response():
+            try:
+                yield SimpleNamespace(text="I'm sorry")
+                yield SimpleNamespace(text=", I can't")
+            finally:
+                closed.append(True)
+
+        async def collect():
+            # checked here, before loop shutdown would finalize the generator anyway
+            try:
+                await service._collect_stream(response(), None, "Chunk")
+            except RuntimeError:
+                return list(closed)
+
+        self.assertEqual(async_to_sync(collect)(), [True])
+
+
+class AIGenerationRetryTests(TestCase):
+    def test_invalid_argument_is_not_retried(self):
+        """A 400 from Gemini fails fast instead of using up the retries."""
+
+        with patch.object(service, "_generate_report_content", side_effect=InvalidArgument("bad request")) as generate, \
+                patch.object(service, "_loop_models"):
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertIsNone(report_data)
+        self.assertTrue(error)
+
+    def test_permission_denied_is_not_retried(self):
+        """A bad API key fails fast; no retry can fix it."""
+
+        with patch.object(service, "_generate_report_content", side_effect=PermissionDenied("bad key")) as generate, \
+                patch.object(service, "_loop_models"):
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertIsNone(report_data)
+        self.assertTrue(error)
+
+    def test_truncated_json_is_retried(self):
+        """Output cut off mid-JSON gets another attempt."""
+
+        report = {"report": []}
+        with patch.object(service, "_generate_report_content", side_effect=[orjson.JSONDecodeError("truncated", '{"re', 4), report]) as generate, \
+                patch.object(service, "_add_risks", return_value={"new vulnerabilities": []}), \
+                patch.object(service, "_backoff", return_value=0), \
+                patch.object(service, "_loop_models"):
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(error, "")
+
+    def test_schema_mismatch_is_retried(self):
+        """A response that doesn't match the schema gets another attempt."""
+
+        report = {"report": []}
+        with patch.object(service, "_generate_report_content", side_effect=[jsonschema.ValidationError("'thought' is a required property"), report]) as generate, \
+                patch.object(service, "_add_risks", return_value={"new vulnerabilities": []}), \
+                patch.object(service, "_backoff", return_value=0), \
+                patch.object(service, "_loop_models"):
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(error, "")
+
+    def test_unavailable_service_is_retried(self):
+        """A transient Gemini error triggers another attempt instead of failing the report."""
+
+        report = {"report": []}
+        with patch.object(service, "_generate_report_content", side_effect=[ServiceUnavailable("busy"), report]) as generate, \
+                patch.object(service, "_add_risks", return_value={"new vulnerabilities": []}), \
+                patch.object(service, "_backoff", return_value=0), \
+                patch.object(service, "_loop_models"):
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(report_data, report)
+        self.assertEqual(error, "")
+
+    @override_settings(GEMINI_API_KEYS=["key-a", "key-b"])
+    def test_rate_limit_rotates_to_next_key_without_waiting(self):
+        """With a key pool, a 429 moves to the next key and retries straight away."""
+
+        keys = []
+
+        def client(client_options):
+            keys.append(client_options["api_key"])
+            return MagicMock()
+
+        report = {"report": []}
+        with patch.object(service, "_generate_report_content", side_effect=[ResourceExhausted("quota"), report]) as generate, \
+                patch.object(service, "_add_risks", return_value={"new vulnerabilities": []}), \
+                patch.object(service.glm, "GenerativeServiceAsyncClient", side_effect=client), \
+                patch.object(service, "_key_cooldowns", {}), \
+                patch.object(service, "_models_by_loop", {}), \
+                patch.object(service.asyncio, "sleep", new_callable=AsyncMock) as sleep:
+            report_data, risks_data, error = service.ai_generation_service({}, {}, "context")
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(error, "")
+        self.assertEqual(keys, ["key-a", "key-b"])
+        sleep.assert_not_awaited()
+
+    def test_event_loops_get_their_own_models(self):
+        """Pipelines on different loops never share (or swap) a client."""
+
+        async def models_twice():
+            return service._loop_models(), service._loop_models()
+
+        with patch.object(service.glm, "GenerativeServiceAsyncClient", side_effect=lambda **kw: MagicMock()), \
+                patch.object(service, "_models_by_loop", {}):
+            first, again = asyncio.run(models_twice())
+            other, _ = asyncio.run(models_twice())
+
+        self.assertIs(first, again)
+        self.assertIsNot(first.client, other.client)
+        self.assertIs(first.report._async_client, first.client)
+        self.assertIs(other.risk._async_client, other.client)
+
+    def test_rate_limit_backoff_is_capped(self):
+        self.assertLessEqual(service._backoff(10), service.MAX_BACKOFF)
+        self.assertGreaterEqual(service._backoff(1), 2)
+
+    def test_rate_limit_waits_for_server_retry_delay(self):
+        """A 429 carrying RetryInfo waits as long as Gemini asked, not the short backoff."""
+
+        retry_info = error_details_pb2.RetryInfo(retry_delay=duration_pb2.Duration(seconds=20))
+        delay = service._retry_delay(ResourceExhausted("quota", details=[retry_info]), 1)
+
+        self.assertGreaterEqual(delay, 20)
+        self.assertLess(delay, 21)
+        self.assertLess(service._retry_delay(ResourceExhausted("quota"), 1), 4)
@@ -12,10 +12,10 @@ from django.utils import timezone
 from accounts.forms import InvitationSignupForm, PublicRegistrationForm
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Invitation, Organization, User, Report, Risk, Scan, generate_email_hash
+from .models import Invitation, Organization, Report, Risk, Scan, generate_email_hash
 from google.auth.transport import requests as google_requests
 from google.oauth2 import id_token
-from .serializers import OrganizationSerializer, UserSerializer, ReportSerializer, RiskSerializer
+from .serializers import OrganizationSerializer, UserSerializer, ReportSerializer, ReportListSerializer, RiskSerializer
 from django.contrib.auth import get_user_model
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_POST
@@ -26,9 +26,11 @@ from django.urls import reverse
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required, permission_required
+import logging
 import secrets
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 ## Simple session-based OTP storage (use Redis/Cache in production)
 # Checks expiration time and verifies otp
@@ -36,8 +38,6 @@ User = get_user_model()
 @ensure_csrf_cookie
 def otp_verify_view(request):
     """Verify OTP code"""
-    print("="*50)
-    print("otp_verify_view called!")
     
     try:
         # Handle both JSON and form data
@@ -46,14 +46,12 @@ def otp_verify_view(request):
         else:
             data = request.POST
         
-        print(f"Verify data: {data}")
-        
         # Handle both formats (otp_input from your form, or otp_code from other implementations)
         otp_input = data.get('otp_input') or data.get('otp_code')
         email = data.get('email')
         purpose = data.get('purpose', 'registration')
         
-        print(f"Verifying - Email: {email}, OTP: {otp_input}, Purpose: {purpose}")
+        logger.debug("Verifying %s OTP for %s", purpose, email)
         
         if not all([otp_input, email]):
             return JsonResponse({'error': 'Missing required fields'}, status=400)
@@ -63,8 +61,6 @@ def otp_verify_view(request):
         stored_purpose = request.session.get('otp_purpose')
         otp_created = request.session.get('otp_created')
         
-        print(f"Stored - Email: {stored_email}, OTP: {stored_otp}, Purpose: {stored_purpose}")
-        
         # Check if OTP expired (5 minutes)
         if not stored_otp or not otp_created:
             return JsonResponse({'error': 'No OTP found. Please request a new one.'}, status=400)
@@ -87,20 +83,15 @@ def otp_verify_view(request):
             request.session.pop('otp_code', None)
             request.session.pop('otp_created', None)
             
-            print("OTP verified successfully!")
-            print("="*50)
+            logger.info("%s OTP verified for %s", purpose, email)
             
             return JsonResponse({'success': True, 'message': 'OTP verified successfully'})
         else:
-            print("OTP verification failed - invalid code")
-            print("="*50)
+            logger.info("Invalid %s OTP for %s", purpose, email)
             return JsonResponse({'error': 'Invalid verification code.'}, status=400)
             
     except Exception as e:
-        print(f"ERROR in otp_verify_view: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print("="*50)
+        logger.exception("otp_verify_view failed")
         return JsonResponse({'error': str(e)}, status=500)
 
 # Sends email with the help of email_factory.py
@@ -108,12 +99,6 @@ def otp_verify_view(request):
 @ensure_csrf_cookie
 def send_otp_view(request):
     """Send OTP to user using email_factory"""
-    print("="*50)
-    print("send_otp_view called!")
-    print(f"Request method: {request.method}")
-    print(f"Content-Type: {request.content_type}")
-    print(f"Request POST data: {request.POST}")
-    print(f"Request body: {request.body}")
     
     try:
         # Handle both JSON and form data
@@ -121,20 +106,16 @@ def send_otp_view(request):
             # JSON data
             try:
                 data = json.loads(request.body)
-                print("Parsed JSON data:", data)
             except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
+                logger.info("send_otp_view got invalid JSON: %s", e)
                 return JsonResponse({'error': 'Invalid JSON'}, status=400)
         else:
             # Form data
             data = request.POST
-            print("Form data:", data)
         
         recipient = data.get('email')
         purpose = data.get('purpose', 'registration')
         
-        print(f"Recipient: {recipient}, Purpose: {purpose}")
-        
         if not recipient:
             return JsonResponse({'error': 'Email is required'}, status=400)
         
@@ -146,11 +127,9 @@ def send_otp_view(request):
         try:
             queue_email('otp', recipient, {'otp': otp})
             
-            print(f"Queued OTP email for {recipient}: {otp}")
-        except Exception as e:
-            print(f"Error queuing email: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.info("Queued %s OTP email for %s", purpose, recipient)
+        except Exception:
+            logger.exception("Failed to queue OTP email for %s", recipient)
             return JsonResponse({'error': 'Failed to queue email'}, status=500)
         
         # 3. Store the OTP in the session
@@ -159,15 +138,9 @@ def send_otp_view(request):
         request.session['otp_purpose'] = purpose
         request.session['otp_created'] = time.time()
         
-        print("OTP stored in session successfully")
-        print("="*50)
-        
         return JsonResponse({'success': True, 'message': 'OTP sent successfully'})        
     except Exception as e:
-        print(f"ERROR in send_otp_view: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print("="*50)
+        logger.exception("send_otp_view failed")
         return JsonResponse({'error': str(e)}, status=500)
 
 def send_invite_mail(request, recipient_email):
@@ -257,12 +230,11 @@ def register_user_invite(request, token):
 @staff_member_required
 def approve_registration(request, user_id):  # user_id will be an integer
     """Approve a user's registration request by ID"""
-    print(f"Approval requested for user ID: {user_id}")
+    logger.info("Approval requested for user ID %s", user_id)
     
     try:
         # Use 'id' field (Django's default auto-incrementing primary key)
         user = User.objects.get(id=user_id, is_active=False)
-        print(f"Found user: {user.username}, email: {user.email}")
     except User.DoesNotExist:
         messages.error(request, f"No pending user found with ID {user_id}")
         return redirect('admin:api_user_changelist')
@@ -286,8 +258,8 @@ def approve_registration(request, user_id):  # user_id will be an integer
             "login_url": f"http://{domain}/accounts/login/",
             "contact_email": settings.ADMIN_EMAIL_INBOX,
         })
-    except Exception as e:
-        print(f"Error queuing approval email: {e}")
+    except Exception:
+        logger.exception("Failed to queue approval email for user %s", user.pk)
     
     messages.success(request, f"User {user.username} has been approved.")
     return redirect('admin:api_user_changelist')
@@ -295,7 +267,7 @@ def approve_registration(request, user_id):  # user_id will be an integer
 @staff_member_required
 def reject_registration(request, user_id):
     """Reject a user's registration request by ID"""
-    print(f"Rejection requested for user ID: {user_id}")
+    logger.info("Rejection requested for user ID %s", user_id)
     
     try:
         user = User.objects.get(id=user_id, is_active=False)
@@ -367,7 +339,7 @@ def _build_login_otp_response(request, user, message='OTP sent to your email'):
     otp = generate_otp()
 
     queue_email('otp', user.email, {'otp': otp})
-    print(f"Queued OTP email for {user.email}: {otp}")
+    logger.info("Queued login OTP email for user %s", user.pk)
 
     request.session['login_otp'] = otp
     request.session['login_otp_created'] = time.time()
@@ -987,8 +959,8 @@ def login_view(request):
                         'errors': {'__all__': ['Invalid username or password']}
                     }, status=400)
                     
-            except Exception as e:
-                print(f"Login error: {e}")
+            except Exception:
+                logger.exception("Login failed")
                 return JsonResponse({
                     'success': False,
                     'errors': {'__all__': ['An error occurred. Please try again.']}
@@ -1018,16 +990,11 @@ def verify_login_otp(request):
         data = json.loads(request.body) if request.body else request.POST
         otp_input = data.get('otp_input')
         
-        print(f"Verifying login OTP: {otp_input}")
-        
         # Get stored OTP from session
         stored_otp = request.session.get('login_otp')
-        stored_email = request.session.get('login_email')
         otp_created = request.session.get('login_otp_created')
         user_id = request.session.get('pending_user_id')
         
-        print(f"Stored OTP: {stored_otp}, Email: {stored_email}, User ID: {user_id}")
-        
         # Check if OTP expired (5 minutes)
         if not stored_otp or not otp_created or (time.time() - otp_created > 300):
             return JsonResponse({
@@ -1054,12 +1021,11 @@ def verify_login_otp(request):
                 # Check if user needs to complete questionnaire
                 needs_questionnaire = False
                 
-                # Debug info
-                print(f"User {user.username} - Organization exists: {user.organization is not None}")
+                logger.debug("User %s has organization: %s", user.pk, user.organization is not None)
                 
                 if user.organization:
                     # Check if questionnaire is completed (this field is NOT encrypted)
-                    print(f"Organization questionnaire_completed: {user.organization.questionnaire_completed}")
+                    logger.debug("Questionnaire completed: %s", user.organization.questionnaire_completed)
                     
                     # Check if this is the first user in the organization
                     # We need to get all users and check in Python due to encryption
@@ -1075,18 +1041,13 @@ def verify_login_otp(request):
                             first_user = u
                     
                     is_first_user = (first_user and first_user.id == user.id)
-                    print(f"Is first user? {is_first_user}")
+                    logger.debug("First user in organization: %s", is_first_user)
                     
                     # Show questionnaire if:
                     # 1. This is the first user AND
                     # 2. Questionnaire not completed
                     if is_first_user and not user.organization.questionnaire_completed:
                         needs_questionnaire = True
-                        print("✓ User needs questionnaire")
-                    else:
-                        print("✗ User does not need questionnaire")
-                else:
-                    print("User has no organization")
                 
                 # Generate proper redirect URLs using reverse
                 if needs_questionnaire:
@@ -1108,9 +1069,7 @@ def verify_login_otp(request):
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid request format'}, status=400)
     except Exception as e:
-        print(f"Error in verify_login_otp: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("verify_login_otp failed")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @login_required
@@ -1132,6 +1091,13 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     serializer_class = OrganizationSerializer
     permission_classes = [IsAuthenticated]
 
+    # staff manage every organization; everyone else only sees their own
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('-created_at')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(pk=self.request.user.organization_id)
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -1139,11 +1105,24 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+
+    # staff manage every user; everyone else only sees their own organization's
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            organization_id = self.request.user.organization_id
+            # without an organization the filter would match every org-less user
+            queryset = queryset.filter(organization_id=organization_id) if organization_id else queryset.none()
+        return self.serializer_class.setup_eager_loading(queryset.order_by('date_joined'))
    
+    # permission objects are stateless, so every request can share the same ones
+    _create_permissions = (AllowAny(),)
+    _permissions = (IsAuthenticated(),)
+
     def get_permissions(self):
         if self.action == 'create':
-            return [AllowAny()]
-        return [IsAuthenticated()]
+            return self._create_permissions
+        return self._permissions
 
 
 class ReportViewSet(viewsets.ModelViewSet):
@@ -1156,8 +1135,19 @@ class ReportViewSet(viewsets.ModelViewSet):
     
     # restrict reports to the user's organization for basic data separation
     def get_queryset(self):
-        # Only show reports belonging to the user's organization
-        return Report.objects.filter(organization=self.request.user.organization).order_by('-started')
+        # Only show reports belonging to the user's organization (none if the
+        # user has no organization). Filtering on the FK column avoids loading
+        # the user's Organization row.
+        organization_id = self.request.user.organization_id
+        queryset = Report.objects.filter(organization_id=organization_id) if organization_id else Report.objects.none()
+        queryset = queryset.order_by('-started')
+        return self.get_serializer_class().setup_eager_loading(queryset)
+
+    def get_serializer_class(self):
+        # the list doesn't need report_text, only retrieve/create/update do
+        if self.action == 'list':
+            return ReportListSerializer
+        return super().get_serializer_class()
         
     # automatically set the user_created and organization fields on creation
     def perform_create(self, serializer):
@@ -1171,9 +1161,18 @@ class RiskViewSet(viewsets.ModelViewSet):
     queryset = Risk.objects.all()
     serializer_class = RiskSerializer
     permission_classes = [IsAuthenticated]
-    
-    # will restrict this further (only show risks related to reports the user can access)
-    # for now, it shows all risks
+
+    # restrict risks to the user's organization, like ReportViewSet
+    def get_queryset(self):
+        organization_id = self.request.user.organization_id
+        if not organization_id:
+            return Risk.objects.none()
+        queryset = (
+            super().get_queryset()
+            .filter(organization_id=organization_id)
+            .order_by('-report__started', 'risk_name')
+        )
+        return self.serializer_class.setup_eager_loading(queryset)
 
 
 
@@ -1242,15 +1241,6 @@ def waiting_page(request):
     }
     return render(request, 'registration/waiting.html', context)
 
-def home(request):
-    """Display home page"""
-    context = {
-        'page_title': 'RePortly',
-        'description': 'Cybersecurity Assessment Tool',
-        'contact_email': settings.ADMIN_EMAIL_INBOX
-    }
-    return render(request, 'home.html', context)
-
 @require_POST
 @login_required
 def check_task_status(request, task_id):
@@ -1410,7 +1400,8 @@ def dashboard(request):
                 })
 
             source_reports = list(
-                Report.objects.filter(report_id__in=report_ids)
+                Report.objects.summaries()
+                .filter(report_id__in=report_ids)
                 .order_by('-completed')
             )
 
@@ -1429,7 +1420,7 @@ def dashboard(request):
     }
     return render(request, 'dashboard.html', context)
 
-from django.db.models import Case, When, Value, IntegerField
+from django.db.models import Case, Count, F, When, Value, IntegerField, Q
 @login_required
 def risks_list(request):
     """Display all risks/vulnerabilities with filtering"""
@@ -1587,54 +1578,43 @@ def report_list(request):
     user = request.user
     organization = user.organization
     
-    # Get reports
+    # Get reports, with their risk counts computed in the same query. The page
+    # only shows a few columns, so rows come back as dicts: no Report/User
+    # instances, and none of the user's encrypted fields get decrypted.
     if organization:
-        reports = Report.objects.filter(organization=organization).order_by('-completed')
+        reports = (
+            Report.objects
+            .filter(organization=organization)
+            .annotate(
+                risk_count=Count('risk'),
+                critical_count=Count('risk', filter=Q(risk__severity='Critical')),
+                high_count=Count('risk', filter=Q(risk__severity='High')),
+                medium_count=Count('risk', filter=Q(risk__severity='Medium')),
+                low_count=Count('risk', filter=Q(risk__severity='Low')),
+                info_count=Count('risk', filter=Q(risk__severity='Info')),
+            )
+            .values(
+                'report_id', 'report_name', 'completed',
+                'risk_count', 'critical_count', 'high_count', 'medium_count', 'low_count', 'info_count',
+                created_by=F('user_created__username'),
+            )
+            .order_by('-completed')
+        )
         has_organization = True
     else:
         reports = Report.objects.none()
         has_organization = False
         # messages.info(request, "No organization associated with your account. Please contact an administrator.")
     
-    # Add risk counts to each report
-    report_list = []
-    for report in reports:
-        report_risks = Risk.objects.filter(report_id=report.report_id)
-
-        # Get severity counts
-        critical_count = report_risks.filter(severity='Critical').count()
-        high_count = report_risks.filter(severity='High').count()
-        medium_count = report_risks.filter(severity='Medium').count()
-        low_count = report_risks.filter(severity='Low').count()
-        info_count = report_risks.filter(severity='Info').count()
-
-        print(f"{report.report_name} crit: {critical_count}")
-        
-        # Create a safe report object with calculated fields
-        report_data = {
-            'id': report.report_id,
-            'report_id': report.report_id,
-            'report_name': report.report_name,
-            'completed': report.completed,
-            'user_created': report.user_created,
-            'risk_count': report_risks.count(),
-            'critical_count': critical_count,
-            'high_count': high_count,
-            'medium_count': medium_count,
-            'low_count': low_count,
-            'info_count': info_count,
-        }
-        report_list.append(report_data)
-    
     # Pagination
-    paginator = Paginator(report_list, 10)
+    paginator = Paginator(reports, 10)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
-        'total_reports': len(report_list),
-        'has_data': len(report_list) > 0,
+        'total_reports': paginator.count,
+        'has_data': paginator.count > 0,
         'has_organization': has_organization,
         'user': user,
         'organization': organization,
@@ -401,8 +401,9 @@ def retry_scan_generation(request, scan_id):
         # scan.status = "RECEIVED" 
         # scan.save(update_fields=['status', 'error_message'])
 
-        # Re-queue just the AI task
-        task_id = async_task('api.services.generate_report_from_scan.generate_report_from_scan', scan_id=str(scan.id))
+        # Re-queue just the AI task, bypassing the AI response cache so the
+        # retry doesn't replay whatever the failed attempt was built from
+        task_id = async_task('api.services.generate_report_from_scan.generate_report_from_scan', scan_id=str(scan.id), skip_cache=True)
         
         # Update status to GENERATING instead of RECEIVED to show that the AI is processing the report
         scan.status = "GENERATING" 
@@ -15,15 +15,19 @@ import sys
 from pathlib import Path
 
 import dj_database_url
-from dotenv import load_dotenv, find_dotenv
-
-# Load environment variables from .env file (only affects local dev;
-# on Heroku, env vars are set via Config Vars)
-load_dotenv(find_dotenv())
+from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Load environment variables from .env file (only affects local dev;
+# on Heroku, env vars are set via Config Vars). Checked at the two places the
+# README's setup puts it, instead of walking up from this file on every start.
+for env_file in (BASE_DIR / '.env', BASE_DIR.parent / '.env'):
+    if env_file.is_file():
+        load_dotenv(env_file)
+        break
+
 # URL prefix for static files
 STATIC_URL = 'static/'
 
@@ -50,6 +54,10 @@ if not SECRET_KEY:
 
 API_KEY = os.environ.get('GEMINI_API_KEY', 'local-gemini-api-key-CHANGE-ME')
 
+# Optional comma-separated pool of Gemini keys; generation rotates to the next
+# key when one hits its rate limit. Defaults to just GEMINI_API_KEY.
+GEMINI_API_KEYS = [key.strip() for key in os.environ.get('GEMINI_API_KEYS', '').split(',') if key.strip()] or [API_KEY]
+
 SALT_KEY = os.environ.get('SALT_KEY', 'local-dev-salt-key-CHANGE-ME')
 
 DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1', 'yes')
@@ -165,6 +173,9 @@ DATABASES = {
     'default': dj_database_url.config(
         default=_DEFAULT_DB_URL,
         conn_max_age=600,
+        # Persistent connections are reused across requests; check them first
+        # so a connection dropped by the server doesn't fail the next request
+        conn_health_checks=True,
         ssl_require=(ENVIRONMENT not in ('local', 'test')),
     )
 }
@@ -195,6 +206,13 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 # Log the user out after 1 hour (3600 seconds) of inactivity
 SESSION_COOKIE_AGE = 3600
 
+# Django REST framework
+# Every list endpoint is paged (?limit=&offset=, 50 by default), so no
+# response serializes a whole table
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.DefaultLimitOffsetPagination',
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -253,6 +271,22 @@ CACHES = {
     }
 }
 
+# Gemini response cache (api/services/llm_cache.py)
+LLM_CACHE_TIMEOUT = int(os.environ.get('LLM_CACHE_TIMEOUT', 60 * 60 * 24))
+# The semantic tier costs an embedding call per generation, so it is opt-in
+LLM_SEMANTIC_CACHE_ENABLED = os.environ.get('LLM_SEMANTIC_CACHE_ENABLED', 'False').lower() in ('true', '1', 'yes')
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('LLM_SEMANTIC_CACHE_THRESHOLD', 0.95))
+
+# Gemini explicit context caching for the static prompt + examples prefix.
+# Off by default: Gemini rejects prefixes under its minimum cache size
+# (model dependent), in which case generation falls back to the full prompt.
+GEMINI_CONTEXT_CACHE_ENABLED = os.environ.get('GEMINI_CONTEXT_CACHE_ENABLED', 'False').lower() in ('true', '1', 'yes')
+GEMINI_CONTEXT_CACHE_TTL = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL', 60 * 60))
+
+# Max Gemini pipelines in flight at once for ai_generation_batch. Size it to the
+# API tier: roughly requests per minute / 60 * average seconds per generation.
+GEMINI_BATCH_CONCURRENCY = int(os.environ.get('GEMINI_BATCH_CONCURRENCY', 8))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -321,6 +355,11 @@ else:
 
 TESTING = 'test' in sys.argv or 'PYTEST_VERSION' in os.environ
 
+if TESTING or ENVIRONMENT == 'test':
+    # PBKDF2 costs ~100 ms per hash, which dominates suites and fixtures that
+    # create many users. MD5 is only acceptable because these are throwaway DBs.
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
 # ---------------------------------------------------------------------------
 # Security settings — enabled for staging & production
 # ---------------------------------------------------------------------------
@@ -17,6 +17,7 @@ Including another URLconf
 from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, path
+from django.views.generic import TemplateView
 
 # Test segment 1
 from api import views
@@ -29,7 +30,14 @@ urlpatterns = [
     path("accounts/", include("django.contrib.auth.urls")),
     
     # Test segment 2
-    path('', views.home, name='home'),  # Home page
+    path('', TemplateView.as_view(
+        template_name='home.html',
+        extra_context={
+            'page_title': 'RePortly',
+            'description': 'Cybersecurity Assessment Tool',
+            'contact_email': settings.ADMIN_EMAIL_INBOX,
+        },
+    ), name='home'),  # Home page
     path('dashboard/', views.dashboard, name='dashboard'),  # /dashboard/
     path('reports/', views.report_list, name='report_list'),  # /reports/
     path('reports/<uuid:report_id>/', views.report_detail, name='report_detail'),  # /reports/1/